@@ -1,31 +1,144 @@
-from typing import TypedDict, Annotated, Sequence, List, Dict
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from typing import TypedDict, Annotated, Sequence, List, Dict, Optional, AsyncIterator, Tuple, ClassVar
+from dataclasses import dataclass
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
+from langgraph.pregel import Pregel
 import operator
+import numpy as np
 from vector_store import VectorStore
 from web_search import WebSearchTool
-from config import settings
+from semantic_cache import SemanticCache
+from embeddings import get_embedder, embed_batch
+from config import get_settings
+import asyncio
+import json
 import logging
+import os
 import re
+import tempfile
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Common "not found" indicators, compiled into a single case-insensitive scan
+INSUFFICIENT_INDICATORS = (
+    "no information",
+    "not available",
+    "cannot find",
+    "no data",
+    "insufficient"
+)
+_INSUFFICIENT_PATTERN = re.compile(
+    "|".join(map(re.escape, INSUFFICIENT_INDICATORS)), 
+    re.IGNORECASE
+)
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Web results have no similarity score; this lets them compete with RAG chunks
+_WEB_RESULT_SCORE = 0.5
+
+# Seconds a web search may take before a speculative RAG-only answer is started;
+# most searches finish sooner, so the common case makes a single Gemini call
+_SPECULATION_DELAY = 1.0
+
+# Comprehensive system prompt for Gemini, built once at import
+_SYSTEM_PROMPT = """You are a helpful AI assistant with access to a knowledge base and web search results.
+Your task is to answer questions based on the provided context.
+
+Rules:
+1. Answer the question using information from the provided context
+2. **ALWAYS cite your sources using the citation markers [1], [2], [3], etc.**
+3. Include citations inline after each claim or fact
+4. If the context doesn't contain enough information, clearly state that
+5. Be concise but comprehensive
+6. If you're unsure, say so rather than making up information
+7. Distinguish between knowledge base sources and web sources when relevant
+
+Example of good citation:
+"The company was founded in 2020 [1] and has over 500 employees [2]. According to recent reports, their revenue grew by 40% [3]."
+"""
+
+_USER_TEMPLATE = """Context from knowledge base and web search:
+{context}
+
+---
+
+Question: {query}
+
+Please provide a detailed answer based on the context above. Remember to cite your sources using [1], [2], etc."""
+
+# Terminal states of a Gemini batch job
+_BATCH_DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED"
+}
+
+
+@dataclass(slots=True)
+class Citation:
+    """A source cited in an answer (document chunk or web result)"""
+    id: int
+    content: str
+    metadata: Optional[Dict] = None
+    relevance_score: Optional[float] = None
+    source: str = "document"
+    title: Optional[str] = None
+    url: Optional[str] = None
+
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
     context: str
     query: str
-    citations: List[Dict]
+    # Text sent to the web search (the bare question, without patient context)
+    search_query: str
+    # (citation id, full text, relevance score) for each context source
+    context_chunks: List[Tuple[int, str, float]]
+    citations: List[Citation]
     web_results: List[Dict]
     needs_web_search: bool
+    # Set by the terminal generate step; plain overwrite channels
+    final_answer: str
+    chunks_used: int
+    used_web_search: bool
+
+
+def _estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+async def _retrieve_node(state: AgentState, config: RunnableConfig) -> Dict:
+    """Graph node: delegate to the agent passed in the run config"""
+    return await config["configurable"]["agent"].retrieve_and_generate(state)
+
+
+async def _web_search_node(state: AgentState, config: RunnableConfig) -> Dict:
+    """Graph node: delegate to the agent passed in the run config"""
+    configurable = config["configurable"]
+    return await configurable["agent"].web_search_and_generate(state, configurable.get("web_task"))
+
+
+def _discard_task_result(task: asyncio.Task):
+    """Retrieve an unused task's outcome so asyncio doesn't log it as unhandled"""
+    if not task.cancelled():
+        task.exception()
 
 
 class RAGAgent:
+    # Compiled once per process; nodes reach the agent via config["configurable"]
+    _compiled_graph: ClassVar[Optional[Pregel]] = None
+    
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
         self.web_search = WebSearchTool()
+        settings = get_settings()
         
         # Initialize Gemini 2.5 Flash
         self.llm = ChatGoogleGenerativeAI(
@@ -35,37 +148,59 @@ class RAGAgent:
             convert_system_message_to_human=True
         )
         
-        # Create the graph
-        self.graph = self._create_graph()
+        # Prompt template is built once and filled per query
+        self._prompt = ChatPromptTemplate.from_messages([
+            ("system", _SYSTEM_PROMPT),
+            ("human", _USER_TEMPLATE)
+        ])
+        
+        # Semantic cache shares the process-wide embedding model
+        self.embedding_model = get_embedder()
+        self.cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl=settings.SEMANTIC_CACHE_TTL,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            dim=settings.EMBEDDING_DIM
+        )
+        
+        # The compiled graph is stateless, so every agent shares one copy
+        if RAGAgent._compiled_graph is None:
+            RAGAgent._compiled_graph = self._create_graph()
+        self.graph = RAGAgent._compiled_graph
+    
+    async def _astream(self, messages: List[BaseMessage]) -> AsyncIterator[str]:
+        """Stream the non-empty text chunks of a Gemini response"""
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
     
-    def retrieve_context(self, state: AgentState) -> AgentState:
+    async def retrieve_context(self, state: AgentState) -> AgentState:
         """Retrieve relevant context from vector store with citation tracking"""
         query = state["query"]
         
         logger.info(f"Retrieving context for query: {query}")
-        results = self.vector_store.search(query, n_results=5)
-        
-        # Combine retrieved documents with citations
-        context_parts = []
-        citations = []
-        
-        for idx, (doc, metadata, distance) in enumerate(
-            zip(results["documents"], results["metadatas"], results["distances"]), 
-            start=1
-        ):
-            # Add citation marker to document
-            citation_id = f"[{idx}]"
-            context_parts.append(f"{citation_id} {doc}")
-            
-            # Store citation info
-            citations.append({
-                "id": idx,
-                "content": doc[:200] + "..." if len(doc) > 200 else doc,
-                "metadata": metadata,
-                "relevance_score": 1 - distance  # Convert distance to similarity
-            })
-        
-        context = "\n\n---\n\n".join(context_parts)
+        # ChromaDB's client is synchronous, keep it off the event loop
+        results = await asyncio.to_thread(self.vector_store.search, query, n_results=5)
+        
+        documents = results["documents"]
+        
+        # Convert distances to similarities in one vectorized op
+        scores = 1.0 - np.asarray(results["distances"], dtype=np.float32)
+        previews = [doc if len(doc) <= 200 else doc[:200] + "..." for doc in documents]
+        
+        # Combine retrieved documents with citation markers
+        citations = [
+            Citation(id=idx, content=preview, metadata=metadata, relevance_score=float(score))
+            for idx, (preview, metadata, score) in enumerate(
+                zip(previews, results["metadatas"], scores), 
+                start=1
+            )
+        ]
+        context_chunks = [
+            (idx, doc, float(score))
+            for idx, (doc, score) in enumerate(zip(documents, scores), start=1)
+        ]
+        context = self._pack_context(context_chunks)
         
         # Check if context is sufficient
         needs_web_search = self._is_context_insufficient(context, query)
@@ -73,16 +208,79 @@ class RAGAgent:
         logger.info(f"Retrieved {len(results['documents'])} relevant chunks")
         logger.info(f"Context sufficiency: {'INSUFFICIENT' if needs_web_search else 'SUFFICIENT'}")
         
+        # Nodes return only the fields they change; LangGraph merges them into
+        # the state and the operator.add reducer appends to messages
         return {
-            **state,
             "context": context,
+            "context_chunks": context_chunks,
             "citations": citations,
             "needs_web_search": needs_web_search,
-            "messages": state["messages"] + [
+            "chunks_used": len(citations),
+            "messages": [
                 AIMessage(content=f"Retrieved {len(results['documents'])} relevant chunks from the knowledge base")
             ]
         }
     
+    async def retrieve_and_generate(self, state: AgentState) -> AgentState:
+        """
+        Retrieve context and, when it is sufficient, generate the answer in the same step
+        
+        This is the fast path: it saves a graph superstep on queries that don't need web search
+        """
+        update = await self.retrieve_context(state)
+        if update["needs_web_search"]:
+            return update
+        
+        generated = await self.generate_response({**state, **update})
+        return self._combine_updates(update, generated)
+    
+    def _combine_updates(self, first: Dict, second: Dict) -> Dict:
+        """Merge two partial state updates produced within one node"""
+        return {**first, **second, "messages": first["messages"] + second["messages"]}
+    
+    def _pack_context(
+        self, 
+        document_chunks: List[Tuple[int, str, float]], 
+        web_chunks: List[Tuple[int, str, float]] = ()
+    ) -> str:
+        """
+        Build the prompt context from the most relevant sources within MAX_CONTEXT_TOKENS
+        
+        Sources are added greedily by relevance score; the selected ones keep their
+        citation order so the [n] markers still match the citations list
+        """
+        budget = get_settings().MAX_CONTEXT_TOKENS
+        ranked = sorted(
+            [(chunk, False) for chunk in document_chunks] + [(chunk, True) for chunk in web_chunks],
+            key=lambda entry: entry[0][2],
+            reverse=True
+        )
+        
+        selected = set()
+        used_tokens = 0
+        dropped_tokens = 0
+        for (idx, text, _), is_web in ranked:
+            tokens = _estimate_tokens(text)
+            if used_tokens + tokens > budget:
+                dropped_tokens += tokens
+                continue
+            selected.add((idx, is_web))
+            used_tokens += tokens
+        
+        if dropped_tokens:
+            logger.info(f"Context budget: kept ~{used_tokens} tokens, dropped ~{dropped_tokens}")
+        
+        context = "\n\n---\n\n".join(
+            f"[{idx}] {text}" for idx, text, _ in document_chunks if (idx, False) in selected
+        )
+        web_context = "\n\n---\n\n".join(
+            f"[{idx}] {text}" for idx, text, _ in web_chunks if (idx, True) in selected
+        )
+        if web_context:
+            context += f"\n\n=== WEB SEARCH RESULTS ===\n\n{web_context}"
+        
+        return context
+    
     def _is_context_insufficient(self, context: str, query: str) -> bool:
         """
         Determine if retrieved context is insufficient
@@ -97,203 +295,448 @@ class RAGAgent:
             return True
         
         # Check for common "not found" indicators
-        insufficient_indicators = [
-            "no information",
-            "not available",
-            "cannot find",
-            "no data",
-            "insufficient"
-        ]
-        
-        context_lower = context.lower()
-        if any(indicator in context_lower for indicator in insufficient_indicators):
+        if _INSUFFICIENT_PATTERN.search(context):
             return True
         
         # Check if context is too generic (low keyword overlap)
-        query_keywords = set(query.lower().split())
-        context_keywords = set(context.lower().split())
+        # Only the query is tokenized; the context is scanned once for those words
+        query_keywords = {
+            word for word in _WORD_PATTERN.findall(query.lower()) if len(word) > 2
+        }
+        if not query_keywords:
+            return False
         
-        overlap = len(query_keywords & context_keywords)
+        keyword_pattern = re.compile(
+            r"\b(?:" + "|".join(map(re.escape, query_keywords)) + r")\b", 
+            re.IGNORECASE
+        )
+        overlap = len({match.lower() for match in keyword_pattern.findall(context)})
         if overlap < len(query_keywords) * 0.3:  # Less than 30% keyword match
             return True
         
         return False
     
-    def web_search_node(self, state: AgentState) -> AgentState:
+    async def web_search_node(self, state: AgentState) -> AgentState:
         """Perform web search for additional context"""
-        query = state["query"]
+        query = state["search_query"]
         
         logger.info(f"Performing web search for: {query}")
         
         # Search the web
-        web_results = self.web_search.search(query, num_results=5)
+        web_results = await self.web_search.search_async(query, num_results=5)
         
+        return self._merge_web_results(state, web_results)
+    
+    def _merge_web_results(self, state: AgentState, web_results: List[Dict]) -> Dict:
+        """Append formatted web results to the retrieved context (partial state update)"""
         # Format web results
-        web_context_parts = []
-        for idx, result in enumerate(web_results, start=len(state["citations"]) + 1):
-            citation_id = f"[{idx}]"
-            content = f"{result.get('title', '')}\n{result.get('body', '')}"
-            web_context_parts.append(f"{citation_id} {content}")
-        
-        web_context = "\n\n---\n\n".join(web_context_parts)
+        web_chunks = [
+            (idx, f"{result.get('title', '')}\n{result.get('body', '')}", _WEB_RESULT_SCORE)
+            for idx, result in enumerate(web_results, start=len(state["citations"]) + 1)
+        ]
         
-        # Combine with existing context
-        combined_context = state["context"]
-        if web_context:
-            combined_context += f"\n\n=== WEB SEARCH RESULTS ===\n\n{web_context}"
+        # Repack the document and web sources together within the budget
+        combined_context = self._pack_context(state["context_chunks"], web_chunks)
         
         logger.info(f"Found {len(web_results)} web results")
         
         return {
-            **state,
             "context": combined_context,
             "web_results": web_results,
-            "messages": state["messages"] + [
+            "used_web_search": len(web_results) > 0,
+            "messages": [
                 AIMessage(content=f"Performed web search and found {len(web_results)} additional sources")
             ]
         }
     
-    def generate_response(self, state: AgentState) -> AgentState:
-        """Generate response using Gemini with context and citations"""
-        context = state["context"]
-        query = state["query"]
-        has_web_results = len(state.get("web_results", [])) > 0
+    def _start_web_search(self, query: str) -> asyncio.Task:
+        """Start a web search in the background"""
+        logger.info(f"Performing web search for: {query}")
+        return asyncio.create_task(self.web_search.search_async(query, num_results=5))
+    
+    async def web_search_and_generate(
+        self, 
+        state: AgentState, 
+        web_task: Optional[asyncio.Task] = None
+    ) -> AgentState:
+        """
+        Run web search, speculatively answering on the RAG-only context if it is slow
         
-        # Create a comprehensive prompt for Gemini
-        system_prompt = """You are a helpful AI assistant with access to a knowledge base and web search results.
-Your task is to answer questions based on the provided context.
-
-Rules:
-1. Answer the question using information from the provided context
-2. **ALWAYS cite your sources using the citation markers [1], [2], [3], etc.**
-3. Include citations inline after each claim or fact
-4. If the context doesn't contain enough information, clearly state that
-5. Be concise but comprehensive
-6. If you're unsure, say so rather than making up information
-7. Distinguish between knowledge base sources and web sources when relevant
-
-Example of good citation:
-"The company was founded in 2020 [1] and has over 500 employees [2]. According to recent reports, their revenue grew by 40% [3]."
-"""
-
-        user_prompt = f"""Context from knowledge base and web search:
-{context}
-
----
-
-Question: {query}
-
-Please provide a detailed answer based on the context above. Remember to cite your sources using [1], [2], etc."""
+        The search gets _SPECULATION_DELAY seconds before a speculative answer is
+        started. The RAG-only answer (speculative or not) is used when the web results
+        don't change the packed context, otherwise the answer is generated from the
+        combined context. web_task is a search for state["search_query"] already started
+        alongside retrieval
+        """
+        if web_task is None:
+            web_task = self._start_web_search(state["search_query"])
+        speculative_task = None
         
+        try:
+            done, _ = await asyncio.wait({web_task}, timeout=_SPECULATION_DELAY)
+            if not done:
+                speculative_task = asyncio.create_task(self.generate_response(state))
+            web_results = await web_task
+        except BaseException:
+            if speculative_task is not None:
+                speculative_task.cancel()
+            raise
+        
+        update = self._merge_web_results(state, web_results) if web_results else None
+        if update is None or update["context"] == state["context"]:
+            # Nothing from the web made it into the context budget
+            logger.info("Web search added no context, answering from documents only")
+            if speculative_task is not None:
+                return await speculative_task
+            return await self.generate_response(state)
+        
+        if speculative_task is not None:
+            speculative_task.cancel()
+        generated = await self.generate_response({**state, **update})
+        
+        return self._combine_updates(update, generated)
+    
+    async def generate_response(self, state: AgentState) -> AgentState:
+        """Generate response using Gemini with context and citations"""
         # Gemini API call
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
+        messages = self._build_messages(state["context"], state["query"])
         
         try:
-            response = self.llm.invoke(messages)
-            
-            # Add source information notice if web search was used
-            answer = response.content
-            if has_web_results:
-                answer += "\n\n*Note: This answer includes information from both your documents and web search results.*"
+            response = await self.llm.ainvoke(messages)
             
-            response = AIMessage(content=answer)
+            answer = self._finalize_answer(response.content, state)
             logger.info("Generated response successfully")
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            response = AIMessage(content=f"Error generating response: {str(e)}")
+            answer = f"Error generating response: {str(e)}"
         
-        return {
-            **state,
-            "messages": state["messages"] + [response]
-        }
+        return {"messages": [AIMessage(content=answer)], "final_answer": answer}
     
-    def should_web_search(self, state: AgentState) -> str:
-        """Decide if we need to perform web search"""
+    async def generate_response_stream(self, state: AgentState) -> AsyncIterator[str]:
+        """Stream the Gemini response token by token"""
+        messages = self._build_messages(state["context"], state["query"])
+        
+        async for token in self._astream(messages):
+            yield token
+        
+        # Source notice (if any) goes out after the generated text
+        notice = self._finalize_answer("", state)
+        if notice:
+            yield notice
+    
+    def _build_messages(self, context: str, query: str) -> List[BaseMessage]:
+        """Build the Gemini prompt for a query and its retrieved context"""
+        return self._prompt.format_messages(context=context, query=query)
+    
+    def _finalize_answer(self, answer: str, state: AgentState) -> str:
+        """Add source information notice if web search was used"""
+        if len(state.get("web_results", [])) > 0:
+            answer += "\n\n*Note: This answer includes information from both your documents and web search results.*"
+        return answer
+    
+    @staticmethod
+    def should_web_search(state: AgentState) -> str:
+        """Decide if we need to perform web search (otherwise the answer is already generated)"""
         if state.get("needs_web_search", False):
             return "web_search"
-        return "generate"
+        return "end"
     
-    def _create_graph(self) -> StateGraph:
+    @classmethod
+    def _create_graph(cls) -> Pregel:
         """Create the LangGraph workflow"""
         workflow = StateGraph(AgentState)
         
-        # Add nodes
-        workflow.add_node("retrieve", self.retrieve_context)
-        workflow.add_node("web_search", self.web_search_node)
-        workflow.add_node("generate", self.generate_response)
+        # Add nodes (the agent instance arrives through the run config)
+        workflow.add_node("retrieve", _retrieve_node)
+        workflow.add_node("web_search", _web_search_node)
         
         # Add edges
         workflow.set_entry_point("retrieve")
         
-        # Conditional edge: retrieve -> web_search or generate
+        # Conditional edge: retrieve -> web_search, or done if it already answered
         workflow.add_conditional_edges(
             "retrieve",
-            self.should_web_search,
+            cls.should_web_search,
             {
                 "web_search": "web_search",
-                "generate": "generate"
+                "end": END
             }
         )
         
-        # web_search -> generate
-        workflow.add_edge("web_search", "generate")
-        workflow.add_edge("generate", END)
+        # web_search generates its own answer
+        workflow.add_edge("web_search", END)
         
         return workflow.compile()
     
-    def query(self, question: str) -> dict:
-        """Query the RAG agent"""
+    def query(
+        self, 
+        question: str, 
+        cache_namespace: Optional[str] = None,
+        cache_text: Optional[str] = None,
+        search_text: Optional[str] = None
+    ) -> dict:
+        """Synchronous wrapper around query_async for callers without an event loop"""
+        return asyncio.run(
+            self.query_async(question, cache_namespace, cache_text, search_text)
+        )
+    
+    async def query_async(
+        self, 
+        question: str, 
+        cache_namespace: Optional[str] = None,
+        cache_text: Optional[str] = None,
+        search_text: Optional[str] = None,
+        prefetch_web_search: bool = False
+    ) -> dict:
+        """
+        Query the RAG agent
+        
+        cache_namespace isolates cached answers (e.g. per patient),
+        cache_text is the text embedded for cache lookup (defaults to question),
+        search_text is what gets sent to the web search (defaults to question;
+        pass the bare user question so patient context never leaves the app) and
+        prefetch_web_search starts the web search in parallel with retrieval
+        for queries likely to need it (discarded if the documents suffice)
+        """
         logger.info(f"Processing query: {question}")
         
-        initial_state = {
+        query_embedding = await asyncio.to_thread(
+            self.embedding_model.encode,
+            cache_text or question, 
+            normalize_embeddings=True
+        )
+        cached = self.cache.lookup(query_embedding, cache_namespace)
+        if cached is not None:
+            return {**cached}
+        
+        state = self._initial_state(question, search_text)
+        configurable = {"agent": self}
+        if prefetch_web_search:
+            configurable["web_task"] = web_task = self._start_web_search(state["search_query"])
+            web_task.add_done_callback(_discard_task_result)
+        
+        try:
+            result = await self.graph.ainvoke(
+                state,
+                config={"configurable": configurable}
+            )
+        finally:
+            if prefetch_web_search:
+                web_task.cancel()
+        
+        response = self._build_result(result)
+        self._cache_result(query_embedding, response, cache_namespace)
+        
+        return response
+    
+    async def query_stream(
+        self, 
+        question: str, 
+        cache_namespace: Optional[str] = None,
+        cache_text: Optional[str] = None,
+        search_text: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Query the RAG agent, streaming the answer as it is generated
+        
+        Yields {"type": "token", "content": str} events while generating and a final
+        {"type": "result", ...} event with the same fields as query_async
+        """
+        logger.info(f"Processing streaming query: {question}")
+        
+        query_embedding = await asyncio.to_thread(
+            self.embedding_model.encode,
+            cache_text or question, 
+            normalize_embeddings=True
+        )
+        cached = self.cache.lookup(query_embedding, cache_namespace)
+        if cached is not None:
+            yield {"type": "token", "content": cached["answer"]}
+            yield {"type": "result", **cached}
+            return
+        
+        # Retrieval and web search are not streamable, run them up front
+        state = self._initial_state(question, search_text)
+        state.update(await self.retrieve_context(state))
+        if state["needs_web_search"]:
+            state.update(await self.web_search_node(state))
+        
+        tokens = []
+        try:
+            async for token in self.generate_response_stream(state):
+                tokens.append(token)
+                yield {"type": "token", "content": token}
+            logger.info("Streamed response successfully")
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            tokens = [f"Error generating response: {str(e)}"]
+            yield {"type": "token", "content": tokens[0]}
+        
+        state["final_answer"] = "".join(tokens)
+        response = self._build_result(state)
+        self._cache_result(query_embedding, response, cache_namespace)
+        
+        yield {"type": "result", **response}
+    
+    def _initial_state(self, question: str, search_text: Optional[str] = None) -> AgentState:
+        """Initial graph state for a question"""
+        return {
             "messages": [HumanMessage(content=question)],
             "context": "",
             "query": question,
+            "search_query": search_text or question,
+            "context_chunks": [],
             "citations": [],
             "web_results": [],
-            "needs_web_search": False
+            "needs_web_search": False,
+            "final_answer": "",
+            "chunks_used": 0,
+            "used_web_search": False
         }
-        
-        result = self.graph.invoke(initial_state)
-        
-        # Extract the final answer
-        answer = ""
-        for message in reversed(result["messages"]):
-            if isinstance(message, AIMessage) and not message.content.startswith("Retrieved") and not message.content.startswith("Performed"):
-                answer = message.content
-                break
-        
-        # Build citations list
-        all_citations = []
-        
-        # Add document citations
-        for citation in result.get("citations", []):
-            all_citations.append({
-                "id": citation["id"],
-                "source": "document",
-                "content": citation["content"],
-                "metadata": citation["metadata"],
-                "relevance_score": citation["relevance_score"]
-            })
+    
+    def _build_result(self, result: AgentState) -> dict:
+        """Build the query response from the final graph state"""
+        # Build citations list, starting with the document citations
+        all_citations = list(result["citations"])
         
         # Add web citations
-        for idx, web_result in enumerate(result.get("web_results", []), start=len(result.get("citations", [])) + 1):
-            all_citations.append({
-                "id": idx,
-                "source": "web",
-                "title": web_result.get("title", ""),
-                "url": web_result.get("href", ""),
-                "content": web_result.get("body", "")[:200] + "..."
-            })
+        for idx, web_result in enumerate(result["web_results"], start=len(all_citations) + 1):
+            all_citations.append(Citation(
+                id=idx,
+                source="web",
+                title=web_result.get("title", ""),
+                url=web_result.get("href", ""),
+                content=web_result.get("body", "")[:200] + "..."
+            ))
         
         return {
-            "answer": answer,
+            "answer": result["final_answer"],
             "citations": all_citations,
-            "context": result.get("context", ""),
-            "used_web_search": len(result.get("web_results", [])) > 0,
-            "chunks_used": len(result.get("citations", []))
-        }
\ No newline at end of file
+            "context": result["context"],
+            "used_web_search": result["used_web_search"],
+            "chunks_used": result["chunks_used"]
+        }
+    
+    def _cache_result(self, query_embedding, response: dict, cache_namespace: Optional[str]) -> bool:
+        """Store a response in the semantic cache unless generation failed"""
+        answer = response["answer"]
+        if not answer or answer.startswith("Error generating response"):
+            return False
+        
+        self.cache.add(query_embedding, response, cache_namespace)
+        return True
+    
+    async def _prepare_states(self, questions: List[str]) -> List[AgentState]:
+        """Run retrieval (and web search where needed) for each question concurrently"""
+        async def prepare(question: str) -> AgentState:
+            state = self._initial_state(question)
+            state.update(await self.retrieve_context(state))
+            if state["needs_web_search"]:
+                state.update(await self.web_search_node(state))
+            return state
+        
+        return await asyncio.gather(*(prepare(question) for question in questions))
+    
+    def query_batch(self, questions: List[str], poll_interval: int = 30) -> List[dict]:
+        """
+        Answer many questions through the Gemini Batch API
+        
+        For offline workloads (cache warmup, evaluation): batch jobs are billed
+        at a discount but complete asynchronously, so this blocks while polling.
+        Interactive traffic should keep using query_async.
+        Returns results in the same order and shape as query().
+        """
+        from google import genai
+        from google.genai import types
+        
+        if not questions:
+            return []
+        
+        settings = get_settings()
+        logger.info(f"Preparing batch of {len(questions)} queries")
+        states = asyncio.run(self._prepare_states(questions))
+        
+        # One JSONL request per question, keyed by its position
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as batch_file:
+            for idx, state in enumerate(states):
+                system_message, user_message = self._build_messages(state["context"], state["query"])
+                request = {
+                    "system_instruction": {"parts": [{"text": system_message.content}]},
+                    "contents": [{"role": "user", "parts": [{"text": user_message.content}]}],
+                    "generation_config": {"temperature": 0.1}
+                }
+                batch_file.write(json.dumps({"key": str(idx), "request": request}) + "\n")
+            batch_path = batch_file.name
+        
+        client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        try:
+            uploaded = client.files.upload(
+                file=batch_path,
+                config=types.UploadFileConfig(display_name="rag-query-batch", mime_type="jsonl")
+            )
+        finally:
+            os.unlink(batch_path)
+        
+        batch_job = client.batches.create(
+            model=settings.GEMINI_MODEL,
+            src=uploaded.name,
+            config={"display_name": "rag-query-batch"}
+        )
+        logger.info(f"Submitted batch job {batch_job.name}")
+        
+        while batch_job.state.name not in _BATCH_DONE_STATES:
+            time.sleep(poll_interval)
+            batch_job = client.batches.get(name=batch_job.name)
+        
+        if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(f"Batch job {batch_job.name} ended in state {batch_job.state.name}")
+        
+        # Collect answers by request key
+        answers = {}
+        output = client.files.download(file=batch_job.dest.file_name).decode("utf-8")
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                parts = record["response"]["candidates"][0]["content"]["parts"]
+                answers[record["key"]] = "".join(part.get("text", "") for part in parts)
+            except (KeyError, IndexError):
+                error = record.get("error", "no response returned")
+                logger.error(f"Batch request {record.get('key')} failed: {error}")
+                answers[record.get("key")] = f"Error generating response: {error}"
+        
+        results = []
+        for idx, state in enumerate(states):
+            answer = answers.get(str(idx), "Error generating response: missing from batch output")
+            if not answer.startswith("Error generating response"):
+                answer = self._finalize_answer(answer, state)
+            state["final_answer"] = answer
+            results.append(self._build_result(state))
+        
+        logger.info(f"Batch job {batch_job.name} completed with {len(results)} results")
+        return results
+    
+    def prewarm_cache(
+        self, 
+        questions: List[str], 
+        cache_namespace: Optional[str] = None
+    ) -> int:
+        """
+        Pre-answer questions via the Batch API and seed the semantic cache
+        
+        Returns the number of answers cached
+        """
+        results = self.query_batch(questions)
+        if not results:
+            return 0
+        
+        embeddings = embed_batch(questions)
+        cached = sum(
+            self._cache_result(embedding, result, cache_namespace)
+            for embedding, result in zip(embeddings, results)
+        )
+        
+        logger.info(f"Pre-warmed semantic cache with {cached} answers")
+        return cached
\ No newline at end of file
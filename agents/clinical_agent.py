@@ -1,10 +1,40 @@
 from typing import Dict, Optional
 import logging
+import re
 from agent import RAGAgent
 from patient_data_manager import PatientDataManager
 
 logger = logging.getLogger(__name__)
 
+# Emergency keywords
+EMERGENCY_KEYWORDS = (
+    'chest pain', 'can\'t breathe', 'severe pain', 
+    'unconscious', 'bleeding heavily', 'stroke',
+    'heart attack', 'seizure', 'suicidal'
+)
+
+# Urgent keywords
+URGENT_KEYWORDS = (
+    'high fever', 'severe swelling', 'sudden weight gain',
+    'difficulty breathing', 'confusion', 'severe headache',
+    'blood in', 'can\'t urinate', 'extreme pain'
+)
+
+# Questions about current research usually go beyond the knowledge base,
+# so their web search is started alongside document retrieval
+RESEARCH_KEYWORDS = (
+    'research', 'study', 'studies', 'clinical trial',
+    'latest', 'recent', 'new treatment', 'news'
+)
+
+# Urgency levels that get the recommendation up front
+ESCALATED_URGENCIES = frozenset({"emergency", "urgent"})
+
+# Compiled once so each message is scanned in a single pass per urgency level
+_EMERGENCY_PATTERN = re.compile("|".join(map(re.escape, EMERGENCY_KEYWORDS)))
+_URGENT_PATTERN = re.compile("|".join(map(re.escape, URGENT_KEYWORDS)))
+_RESEARCH_PATTERN = re.compile("|".join(map(re.escape, RESEARCH_KEYWORDS)))
+
 
 class ClinicalAgent:
     """
@@ -16,7 +46,7 @@ class ClinicalAgent:
         self.rag_agent = rag_agent
         self.patient_manager = patient_manager
     
-    def handle_query(
+    async def handle_query(
         self, 
         query: str, 
         patient_data: Optional[Dict] = None,
@@ -36,8 +66,14 @@ class ClinicalAgent:
         # Add patient context to query
         enhanced_query = self._enhance_query_with_context(query, patient_data)
         
-        # Get RAG response
-        rag_result = self.rag_agent.query(enhanced_query)
+        # Get RAG response (cached answers are scoped to the patient)
+        rag_result = await self.rag_agent.query_async(
+            enhanced_query,
+            cache_namespace=patient_data.get('patient_name') if patient_data else None,
+            cache_text=query,
+            search_text=query,
+            prefetch_web_search=_RESEARCH_PATTERN.search(query.lower()) is not None
+        )
         
         # Assess urgency
         urgency = self._assess_urgency(query, is_warning_sign, patient_data)
@@ -89,24 +125,10 @@ Patient Question: {query}
         """Assess urgency level of the query"""
         query_lower = query.lower()
         
-        # Emergency keywords
-        emergency_keywords = [
-            'chest pain', 'can\'t breathe', 'severe pain', 
-            'unconscious', 'bleeding heavily', 'stroke',
-            'heart attack', 'seizure', 'suicidal'
-        ]
-        
-        # Urgent keywords
-        urgent_keywords = [
-            'high fever', 'severe swelling', 'sudden weight gain',
-            'difficulty breathing', 'confusion', 'severe headache',
-            'blood in', 'can\'t urinate', 'extreme pain'
-        ]
-        
-        if any(keyword in query_lower for keyword in emergency_keywords):
+        if _EMERGENCY_PATTERN.search(query_lower):
             return "emergency"
         
-        if is_warning_sign or any(keyword in query_lower for keyword in urgent_keywords):
+        if is_warning_sign or _URGENT_PATTERN.search(query_lower):
             return "urgent"
         
         return "routine"
@@ -147,7 +169,7 @@ Patient Question: {query}
         response = ""
         
         # Add urgency header if needed
-        if urgency in ["emergency", "urgent"]:
+        if urgency in ESCALATED_URGENCIES:
             response += f"{recommendation}\n\n---\n\n"
         
         # Add warning sign notice
@@ -1,9 +1,41 @@
 from typing import Dict, Optional
 import logging
+import re
 from patient_data_manager import PatientDataManager
 
 logger = logging.getLogger(__name__)
 
+# Medical concern keywords
+MEDICAL_KEYWORDS = (
+    'pain', 'swelling', 'fever', 'bleeding', 'dizzy', 
+    'short of breath', 'chest pain', 'nausea', 'vomiting',
+    'headache', 'rash', 'infection', 'weight gain',
+    'difficulty breathing', 'confused', 'weak', 'tired'
+)
+
+# Question keywords
+QUESTION_KEYWORDS = (
+    'what is', 'why', 'how', 'when', 'should i',
+    'can i', 'is it normal', 'treatment', 'side effect',
+    'research', 'study', 'guideline', 'recommend'
+)
+
+# Compiled once so routing scans each message in a single pass per keyword set
+_MEDICAL_PATTERN = re.compile("|".join(map(re.escape, MEDICAL_KEYWORDS)))
+_QUESTION_PATTERN = re.compile("|".join(map(re.escape, QUESTION_KEYWORDS)))
+
+# General query topics; group names are the info types passed to get_patient_info
+_TOPIC_PATTERN = re.compile(
+    r"(?P<medications>medication|medicine|pill)"
+    r"|(?P<diet>diet|food|eat|drink)"
+    r"|(?P<follow_up>appointment|follow-up|follow up)"
+    r"|(?P<warnings>warning|signs|symptoms|watch)"
+    r"|(?P<summary>discharge|summary|report|information)"
+)
+
+# When a message mentions several topics, the first one in this order wins
+_TOPIC_PRIORITY = ("medications", "diet", "follow_up", "warnings", "summary")
+
 
 class ReceptionistAgent:
     """
@@ -39,12 +71,7 @@ class ReceptionistAgent:
         patient = self.patient_manager.find_patient(name)
         
         if patient:
-            # Store in conversation state
-            self.conversation_state[session_id] = {
-                "patient_name": name,
-                "patient_data": patient,
-                "identified": True
-            }
+            self.remember_patient(session_id, patient, name)
             
             message = (
                 f"Hi {patient.get('patient_name')}! 😊\n\n"
@@ -71,6 +98,23 @@ class ReceptionistAgent:
                 "patient_data": None
             }
     
+    def remember_patient(self, session_id: str, patient: Dict, name: Optional[str] = None):
+        """
+        Store an identified patient in conversation state
+        Also used to restore state for sessions identified on another worker
+        """
+        self.conversation_state[session_id] = {
+            "patient_name": name or patient.get("patient_name"),
+            "patient_data": patient,
+            "identified": True,
+            # Compiled once and reused on every message in the session
+            "warning_pattern": self.patient_manager.compile_warning_signs(patient)
+        }
+    
+    def forget_patient(self, session_id: str):
+        """Drop conversation state for an ended session"""
+        self.conversation_state.pop(session_id, None)
+    
     def get_patient_info(self, session_id: str, info_type: str = "summary") -> str:
         """Get specific patient information"""
         state = self.conversation_state.get(session_id)
@@ -107,24 +151,9 @@ class ReceptionistAgent:
         """
         message_lower = message.lower()
         
-        # Medical concern keywords
-        medical_keywords = [
-            'pain', 'swelling', 'fever', 'bleeding', 'dizzy', 
-            'short of breath', 'chest pain', 'nausea', 'vomiting',
-            'headache', 'rash', 'infection', 'weight gain',
-            'difficulty breathing', 'confused', 'weak', 'tired'
-        ]
-        
-        # Question keywords
-        question_keywords = [
-            'what is', 'why', 'how', 'when', 'should i',
-            'can i', 'is it normal', 'treatment', 'side effect',
-            'research', 'study', 'guideline', 'recommend'
-        ]
-        
         # Check for medical concerns
-        has_medical_keyword = any(keyword in message_lower for keyword in medical_keywords)
-        has_question = any(keyword in message_lower for keyword in question_keywords)
+        has_medical_keyword = _MEDICAL_PATTERN.search(message_lower) is not None
+        has_question = _QUESTION_PATTERN.search(message_lower) is not None
         
         # Check if it's a warning sign
         is_warning_sign = False
@@ -132,7 +161,7 @@ class ReceptionistAgent:
         if state and state.get("identified"):
             patient_data = state.get("patient_data")
             is_warning_sign = self.patient_manager.check_warning_signs(
-                patient_data, message
+                patient_data, message, state.get("warning_pattern")
             )
         
         if has_medical_keyword or has_question or is_warning_sign:
@@ -156,21 +185,12 @@ class ReceptionistAgent:
         """Handle non-medical queries"""
         message_lower = message.lower()
         
-        # Check for common questions
-        if any(word in message_lower for word in ['medication', 'medicine', 'pill']):
-            return self.get_patient_info(session_id, "medications")
-        
-        elif any(word in message_lower for word in ['diet', 'food', 'eat', 'drink']):
-            return self.get_patient_info(session_id, "diet")
-        
-        elif any(word in message_lower for word in ['appointment', 'follow-up', 'follow up']):
-            return self.get_patient_info(session_id, "follow_up")
-        
-        elif any(word in message_lower for word in ['warning', 'signs', 'symptoms', 'watch']):
-            return self.get_patient_info(session_id, "warnings")
+        # Check for common questions in a single scan over the message
+        topics = {match.lastgroup for match in _TOPIC_PATTERN.finditer(message_lower)}
+        info_type = next((topic for topic in _TOPIC_PRIORITY if topic in topics), None)
         
-        elif any(word in message_lower for word in ['discharge', 'summary', 'report', 'information']):
-            return self.get_patient_info(session_id, "summary")
+        if info_type:
+            return self.get_patient_info(session_id, info_type)
         
         else:
             return (
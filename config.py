@@ -1,21 +1,43 @@
-import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     CHROMA_PERSIST_DIR: str = "./chroma_db"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_DIM: int = 384  # Output size of EMBEDDING_MODEL
+    EMBEDDING_ONNX_PATH: str = ""  # ONNX export of EMBEDDING_MODEL; empty uses PyTorch
     
     # Adjusted chunk settings for large PDFs
     CHUNK_SIZE: int = 1500  # Increased from 1000
     CHUNK_OVERLAP: int = 300  # Increased from 200
     
+    # Extracted PDF text, keyed by file content hash (empty disables the cache)
+    PDF_CACHE_DIR: str = "./pdf_cache"
+    
     # ChromaDB settings
     MAX_BATCH_SIZE: int = 5000
     
-    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    # Read from the GOOGLE_API_KEY environment variable or .env
+    GOOGLE_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-2.5-flash"
+    MAX_CONTEXT_TOKENS: int = 4000  # Prompt budget for RAG + web context
+    
+    # Semantic response cache settings
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a hit
+    SEMANTIC_CACHE_TTL: int = 3600  # Seconds before a cached answer expires
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 512  # Per namespace
+    
+    # Conversation sessions: Redis shares them across workers, empty keeps them in process
+    REDIS_URL: str = ""
+    SESSION_TTL: int = 3600  # Seconds of inactivity before a session expires
+    SESSION_CLEANUP_INTERVAL: int = 900  # Seconds between idle-session sweeps (in-memory store)
+    MAX_HISTORY: int = 200  # Messages kept per session; older turns are dropped
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build settings on first use and reuse them for the life of the process"""
+    return Settings()
@@ -1,12 +1,32 @@
 from typing import Dict, List, Optional
+import asyncio
 import logging
+import sys
+import time
 from datetime import datetime
-import uuid
+import secrets
 from agents.receptionist_agent import ReceptionistAgent
 from agents.clinical_agent import ClinicalAgent
+from session_store import InMemorySessionStore, Session
 
 logger = logging.getLogger(__name__)
 
+# Roles and agent names stored on every message; interned so comparisons are identity checks
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+AGENT_RECEPTIONIST = sys.intern("receptionist")
+AGENT_CLINICAL = sys.intern("clinical")
+
+
+def format_messages(messages) -> List[Dict]:
+    """Copy stored messages for output, turning ts_ns into an ISO timestamp"""
+    formatted = []
+    for message in messages:
+        message = dict(message)
+        message["timestamp"] = datetime.fromtimestamp(message.pop("ts_ns") / 1e9).isoformat()
+        formatted.append(message)
+    return formatted
+
 
 class ConversationManager:
     """
@@ -16,45 +36,62 @@ class ConversationManager:
     def __init__(
         self, 
         receptionist_agent: ReceptionistAgent,
-        clinical_agent: ClinicalAgent
+        clinical_agent: ClinicalAgent,
+        session_store=None
     ):
         self.receptionist = receptionist_agent
         self.clinical = clinical_agent
-        self.sessions = {}  # session_id -> conversation history
+        # session_id -> conversation state (in-process unless a shared store is given)
+        self.store = session_store or InMemorySessionStore()
+        # Serializes turns within a session; different sessions run concurrently
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Last time (ns) this worker used each session, for evicting local state
+        self._last_active: Dict[str, int] = {}
     
-    def create_session(self) -> str:
+    async def create_session(self) -> str:
         """Create a new conversation session"""
-        session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {
-            "created_at": datetime.now().isoformat(),
-            "messages": [],
-            "patient_identified": False,
-            "patient_data": None,
-            "current_agent": "receptionist"
-        }
+        session_id = secrets.token_urlsafe(16)
+        await self.store.create(session_id, Session(
+            created_ns=time.time_ns(),
+            current_agent=AGENT_RECEPTIONIST
+        ))
+        self._session_lock(session_id)
         logger.info(f"Created new session: {session_id}")
         return session_id
     
-    def get_session(self, session_id: str) -> Optional[Dict]:
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """
+        Per-session lock, created on demand for sessions started on another worker
+        Getting it marks the session as active on this worker
+        """
+        self._last_active[session_id] = time.time_ns()
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+    
+    async def get_session(self, session_id: str) -> Optional[Session]:
         """Get session data"""
-        return self.sessions.get(session_id)
+        return await self.store.get(session_id)
     
-    def start_conversation(self, session_id: str) -> Dict:
+    async def start_conversation(self, session_id: str) -> Dict:
         """Start a new conversation"""
         greeting = self.receptionist.greet()
         
-        self._add_message(session_id, "assistant", greeting, "receptionist")
+        async with self._session_lock(session_id):
+            await self._add_message(session_id, ROLE_ASSISTANT, greeting, AGENT_RECEPTIONIST)
         
         return {
             "session_id": session_id,
             "message": greeting,
-            "agent": "receptionist",
+            "agent": AGENT_RECEPTIONIST,
             "requires_input": True
         }
     
-    def process_message(self, session_id: str, user_message: str) -> Dict:
+    async def process_message(self, session_id: str, user_message: str) -> Dict:
         """
         Process user message and route to appropriate agent
+        Turns within one session are serialized; other sessions are not blocked
         
         Returns:
             {
@@ -65,8 +102,14 @@ class ConversationManager:
                 "patient_data": Optional[Dict]
             }
         """
-        session = self.sessions.get(session_id)
+        async with self._session_lock(session_id):
+            return await self._process_message(session_id, user_message)
+    
+    async def _process_message(self, session_id: str, user_message: str) -> Dict:
+        """Body of process_message; runs under the session lock"""
+        session = await self.store.get(session_id)
         if not session:
+            self._forget_local(session_id)
             return {
                 "error": "Session not found. Please start a new conversation.",
                 "message": "Session expired. Let's start over!",
@@ -74,98 +117,104 @@ class ConversationManager:
             }
         
         # Add user message to history
-        self._add_message(session_id, "user", user_message)
+        await self._add_message(session_id, ROLE_USER, user_message)
         
         # Check if patient is identified
-        if not session["patient_identified"]:
-            return self._handle_patient_identification(session_id, user_message)
+        if not session.patient_identified:
+            return await self._handle_patient_identification(session_id, user_message)
+        
+        # The patient may have been identified by another worker
+        if session_id not in self.receptionist.conversation_state:
+            self.receptionist.remember_patient(session_id, session.patient_data)
         
         # Check if should route to clinical agent
         routing = self.receptionist.should_route_to_clinical(user_message, session_id)
         
         if routing["route"]:
-            return self._handle_clinical_query(
+            return await self._handle_clinical_query(
+                session, 
                 session_id, 
                 user_message, 
                 routing["is_warning_sign"]
             )
         else:
-            return self._handle_general_query(session_id, user_message)
+            return await self._handle_general_query(session, session_id, user_message)
     
-    def _handle_patient_identification(self, session_id: str, name: str) -> Dict:
+    async def _handle_patient_identification(self, session_id: str, name: str) -> Dict:
         """Handle patient name and identification"""
         result = self.receptionist.identify_patient(name, session_id)
         
-        session = self.sessions[session_id]
-        
         if result["found"]:
-            session["patient_identified"] = True
-            session["patient_data"] = result["patient_data"]
+            await self.store.update(
+                session_id,
+                patient_identified=True,
+                patient_data=result["patient_data"]
+            )
             
-            self._add_message(
+            await self._add_message(
                 session_id, 
-                "assistant", 
+                ROLE_ASSISTANT, 
                 result["message"], 
-                "receptionist"
+                AGENT_RECEPTIONIST
             )
             
             return {
                 "message": result["message"],
-                "agent": "receptionist",
+                "agent": AGENT_RECEPTIONIST,
                 "patient_data": result["patient_data"],
                 "requires_input": True
             }
         else:
-            self._add_message(
+            await self._add_message(
                 session_id, 
-                "assistant", 
+                ROLE_ASSISTANT, 
                 result["message"], 
-                "receptionist"
+                AGENT_RECEPTIONIST
             )
             
             return {
                 "message": result["message"],
-                "agent": "receptionist",
+                "agent": AGENT_RECEPTIONIST,
                 "requires_input": True
             }
     
-    def _handle_clinical_query(
+    async def _handle_clinical_query(
         self, 
+        session: Session,
         session_id: str, 
         query: str,
         is_warning_sign: bool
     ) -> Dict:
         """Route to clinical agent"""
-        session = self.sessions[session_id]
-        patient_data = session.get("patient_data")
+        patient_data = session.patient_data
         
         # Transition message
-        if session["current_agent"] != "clinical":
+        if session.current_agent != AGENT_CLINICAL:
             transition = (
                 "This sounds like a medical concern. "
                 "Let me connect you with our Clinical AI Agent... 🏥"
             )
-            self._add_message(session_id, "assistant", transition, "receptionist")
-            session["current_agent"] = "clinical"
+            await self._add_message(session_id, ROLE_ASSISTANT, transition, AGENT_RECEPTIONIST)
+            await self.store.update(session_id, current_agent=AGENT_CLINICAL)
         
         # Get clinical response
-        clinical_result = self.clinical.handle_query(
+        clinical_result = await self.clinical.handle_query(
             query=query,
             patient_data=patient_data,
             is_warning_sign=is_warning_sign
         )
         
-        self._add_message(
+        await self._add_message(
             session_id, 
-            "assistant", 
+            ROLE_ASSISTANT, 
             clinical_result["answer"], 
-            "clinical",
+            AGENT_CLINICAL,
             citations=clinical_result.get("citations", [])
         )
         
         response = {
             "message": clinical_result["answer"],
-            "agent": "clinical",
+            "agent": AGENT_CLINICAL,
             "citations": clinical_result.get("citations", []),
             "used_web_search": clinical_result.get("used_web_search", False),
             "urgency": clinical_result.get("urgency"),
@@ -180,25 +229,23 @@ class ConversationManager:
         
         return response
     
-    def _handle_general_query(self, session_id: str, query: str) -> Dict:
+    async def _handle_general_query(self, session: Session, session_id: str, query: str) -> Dict:
         """Handle general queries with receptionist"""
-        session = self.sessions[session_id]
-        
         # Transition back from clinical if needed
-        if session["current_agent"] == "clinical":
-            session["current_agent"] = "receptionist"
+        if session.current_agent == AGENT_CLINICAL:
+            await self.store.update(session_id, current_agent=AGENT_RECEPTIONIST)
         
         response = self.receptionist.handle_general_query(query, session_id)
         
-        self._add_message(session_id, "assistant", response, "receptionist")
+        await self._add_message(session_id, ROLE_ASSISTANT, response, AGENT_RECEPTIONIST)
         
         return {
             "message": response,
-            "agent": "receptionist",
+            "agent": AGENT_RECEPTIONIST,
             "requires_input": True
         }
     
-    def _add_message(
+    async def _add_message(
         self, 
         session_id: str, 
         role: str, 
@@ -207,28 +254,74 @@ class ConversationManager:
         citations: List = None
     ):
         """Add message to conversation history"""
-        session = self.sessions.get(session_id)
-        if session:
-            message = {
-                "role": role,
-                "content": content,
-                "timestamp": datetime.now().isoformat(),
-                "agent": agent
-            }
-            if citations:
-                message["citations"] = citations
-            
-            session["messages"].append(message)
+        message = {
+            "role": role,
+            "content": content,
+            # Formatted lazily when history is read
+            "ts_ns": time.time_ns(),
+            "agent": agent
+        }
+        if citations:
+            message["citations"] = citations
+        
+        await self.store.append_message(session_id, message)
     
-    def get_conversation_history(self, session_id: str) -> List[Dict]:
+    async def get_conversation_history(self, session_id: str) -> List[Dict]:
         """Get full conversation history"""
-        session = self.sessions.get(session_id)
+        session = await self.store.get(session_id)
         if session:
-            return session["messages"]
+            return format_messages(session.messages)
         return []
     
-    def end_session(self, session_id: str):
-        """End conversation session"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            logger.info(f"Ended session: {session_id}")
\ No newline at end of file
+    def _forget_local(self, session_id: str):
+        """Drop this worker's state for a session; the stored session is untouched"""
+        self._locks.pop(session_id, None)
+        self._last_active.pop(session_id, None)
+        self.receptionist.forget_patient(session_id)
+    
+    def _is_busy(self, session_id: str) -> bool:
+        """Whether a turn is in progress for the session on this worker"""
+        lock = self._locks.get(session_id)
+        return lock is not None and lock.locked()
+    
+    async def end_session(self, session_id: str):
+        """End conversation session, waiting for a turn in progress to finish"""
+        async with self._session_lock(session_id):
+            deleted = await self.store.delete(session_id)
+        self._forget_local(session_id)
+        if deleted:
+            logger.info(f"Ended session: {session_id}")
+    
+    async def cleanup_loop(self, interval: int = 900, max_idle: int = 3600):
+        """
+        Periodically end sessions idle for more than max_idle seconds
+        Covers sessions the client never ended (e.g. a closed browser tab)
+        
+        Sessions the store reports as stale are ended outright. Independently of the
+        store, this worker's own per-session state (locks, receptionist state) is
+        dropped once it has been idle here that long; a shared store expires the
+        sessions themselves, and a later turn rebuilds the local state
+        """
+        max_idle_ns = max_idle * 1_000_000_000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = 0
+                for session_id in await self.store.stale_sessions(max_idle_ns):
+                    # Leave sessions with a turn in progress alone
+                    if not self._is_busy(session_id):
+                        await self.end_session(session_id)
+                        evicted += 1
+                
+                cutoff = time.time_ns() - max_idle_ns
+                idle = [
+                    session_id for session_id, last_active in self._last_active.items()
+                    if last_active < cutoff and not self._is_busy(session_id)
+                ]
+                for session_id in idle:
+                    self._forget_local(session_id)
+                
+                if evicted or idle:
+                    logger.info(f"Evicted {evicted} idle sessions, released local state of {len(idle)}")
+            except Exception as e:
+                logger.error(f"Error evicting idle sessions: {e}")
@@ -0,0 +1,110 @@
+from sentence_transformers import SentenceTransformer
+from functools import lru_cache
+from typing import List, Optional, Union
+from pathlib import Path
+import numpy as np
+import torch
+from config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbedder:
+    """
+    Sentence embeddings from an ONNX export of the embedding model (e.g. INT8 quantized)
+    
+    Export and quantize once with:
+        optimum-cli export onnx --model all-MiniLM-L6-v2 --task feature-extraction onnx_model/
+        optimum-cli onnxruntime quantize --avx512_vnni --onnx_model onnx_model/ -o onnx_int8/
+    
+    encode() mirrors SentenceTransformer.encode for the arguments this app uses;
+    embeddings are mean-pooled and always L2-normalized like the default model
+    """
+    
+    def __init__(self, model_path: str, max_length: int = 256):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        quantized = [p.name for p in Path(model_path).glob("*quantized*.onnx")]
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_path, 
+            file_name=quantized[0] if quantized else None
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_length = max_length
+    
+    def encode(
+        self, 
+        sentences, 
+        batch_size: int = 128, 
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.empty((0, self.model.config.hidden_size), dtype=np.float32)
+        
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            
+            # Mean over real tokens only
+            mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+            batches.append((token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+        
+        embeddings = np.concatenate(batches).astype(np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        
+        return embeddings[0] if single else embeddings
+
+
+def get_embedder(model_name: Optional[str] = None) -> Union[SentenceTransformer, OnnxEmbedder]:
+    """
+    Load a sentence-transformer once per process and share it across components
+    model_name defaults to EMBEDDING_MODEL; when EMBEDDING_ONNX_PATH is set,
+    that default model runs on ONNX Runtime instead
+    
+    The model is warmed up before it is returned, so CUDA/MKL kernel setup happens
+    at load time rather than on the first query. Load it in the parent before
+    forking ingestion workers and they share the warm model copy-on-write
+    """
+    return _load_embedder(model_name or get_settings().EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=4)
+def _load_embedder(model_name: str) -> Union[SentenceTransformer, OnnxEmbedder]:
+    """Body of get_embedder, cached on the resolved model name"""
+    settings = get_settings()
+    if settings.EMBEDDING_ONNX_PATH and model_name == settings.EMBEDDING_MODEL:
+        logger.info(f"Loading ONNX embedding model from {settings.EMBEDDING_ONNX_PATH}")
+        model = OnnxEmbedder(settings.EMBEDDING_ONNX_PATH)
+    else:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        logger.info(f"Loading embedding model {model_name} on {device}")
+        model = SentenceTransformer(model_name, device=device)
+    
+    model.encode(["warmup"], show_progress_bar=False)
+    return model
+
+
+def embed_batch(texts: List[str], model_name: Optional[str] = None) -> np.ndarray:
+    """Embed a batch of texts into L2-normalized vectors (cosine == dot product)"""
+    return get_embedder(model_name).encode(
+        texts,
+        batch_size=64,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
@@ -1,20 +1,26 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 import os
+import json
+import asyncio
 import tempfile
 import logging
 
-from pdf_processor import RobustPDFProcessor
+from pdf_processor import RobustPDFProcessor, SparseTextError
 from vector_store import VectorStore
 from agent import RAGAgent
 from patient_data_manager import PatientDataManager
 from agents.receptionist_agent import ReceptionistAgent
 from agents.clinical_agent import ClinicalAgent
-from conversation_manager import ConversationManager
-from config import settings
+from conversation_manager import ConversationManager, format_messages
+from session_store import create_session_store
+from pipeline import prefetch
+from config import get_settings
 
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -26,7 +32,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Patient Care Chatbot with RAG",
     description="Multi-agent patient care system with RAG, citations, and web search",
-    version="2.0.0"
+    version="2.0.0",
+    # orjson encodes the dict-heavy chat and patient payloads much faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -46,7 +54,7 @@ async def chat_ui():
     return FileResponse("static/index.html")
 
 # Initialize components
-pdf_processor = RobustPDFProcessor()
+pdf_processor = RobustPDFProcessor(cache_dir=get_settings().PDF_CACHE_DIR)
 vector_store = VectorStore()
 rag_agent = RAGAgent(vector_store)
 patient_manager = PatientDataManager()
@@ -55,8 +63,37 @@ patient_manager = PatientDataManager()
 receptionist_agent = ReceptionistAgent(patient_manager)
 clinical_agent = ClinicalAgent(rag_agent, patient_manager)
 
-# Initialize conversation manager
-conversation_manager = ConversationManager(receptionist_agent, clinical_agent)
+# Initialize conversation manager (sessions are shared across workers when Redis is configured)
+session_store = create_session_store(
+    get_settings().REDIS_URL,
+    ttl=get_settings().SESSION_TTL,
+    max_messages=get_settings().MAX_HISTORY
+)
+conversation_manager = ConversationManager(receptionist_agent, clinical_agent, session_store)
+
+
+def _log_prefetch_failure(future: asyncio.Future):
+    """Done-callback for the startup prefetch, which nothing awaits"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Vector index prefetch failed: {future.exception()}")
+
+
+@app.on_event("startup")
+async def prefetch_vector_index():
+    """Load the vector index in the background so the first query doesn't wait on disk"""
+    # Keep a reference and report failures; a slow first query is the only cost
+    app.state.vector_prefetch = asyncio.get_running_loop().run_in_executor(None, vector_store.prefetch)
+    app.state.vector_prefetch.add_done_callback(_log_prefetch_failure)
+
+
+@app.on_event("startup")
+async def start_session_cleanup():
+    """Evict sessions that were abandoned without being ended"""
+    # Keep a reference so the task isn't garbage collected
+    app.state.session_cleanup = asyncio.create_task(conversation_manager.cleanup_loop(
+        interval=get_settings().SESSION_CLEANUP_INTERVAL,
+        max_idle=get_settings().SESSION_TTL
+    ))
 
 
 # ============== Pydantic Models ==============
@@ -73,6 +110,7 @@ class ChatMessageRequest(BaseModel):
 
 
 class Citation(BaseModel):
+    """Shape of the RAG agent's Citation dataclass, for the API schema"""
     id: int
     source: str
     content: str
@@ -94,6 +132,11 @@ class ChatMessageResponse(BaseModel):
     requires_input: bool = True
 
 
+class QueryRequest(BaseModel):
+    """Request to query the knowledge base directly"""
+    question: str
+
+
 class ConversationHistoryResponse(BaseModel):
     """Conversation history response"""
     session_id: str
@@ -112,8 +155,8 @@ async def start_chat():
     Returns initial greeting from receptionist agent
     """
     try:
-        session_id = conversation_manager.create_session()
-        result = conversation_manager.start_conversation(session_id)
+        session_id = await conversation_manager.create_session()
+        result = await conversation_manager.start_conversation(session_id)
         
         return ChatMessageResponse(
             session_id=result["session_id"],
@@ -136,7 +179,7 @@ async def send_message(request: ChatMessageRequest):
     try:
         logger.info(f"Processing message in session {request.session_id}: {request.message}")
         
-        result = conversation_manager.process_message(
+        result = await conversation_manager.process_message(
             session_id=request.session_id,
             user_message=request.message
         )
@@ -144,20 +187,22 @@ async def send_message(request: ChatMessageRequest):
         if "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         
-        citations = None
+        # Built directly rather than through ChatMessageResponse: the data is our own,
+        # so skip validation (orjson serializes the RAG Citation dataclasses as-is)
+        payload = {
+            "session_id": request.session_id,
+            "message": result["message"],
+            "agent": result["agent"],
+            "requires_input": result.get("requires_input", True)
+        }
+        # Optional fields are only sent when the agent set them
+        for field in ("urgency", "used_web_search", "patient_data"):
+            if result.get(field) is not None:
+                payload[field] = result[field]
         if result.get("citations"):
-            citations = [Citation(**c) for c in result["citations"]]
+            payload["citations"] = result["citations"]
         
-        return ChatMessageResponse(
-            session_id=request.session_id,
-            message=result["message"],
-            agent=result["agent"],
-            citations=citations,
-            urgency=result.get("urgency"),
-            used_web_search=result.get("used_web_search"),
-            patient_data=result.get("patient_data"),
-            requires_input=result.get("requires_input", True)
-        )
+        return ORJSONResponse(payload)
     
     except HTTPException:
         raise
@@ -172,17 +217,17 @@ async def get_conversation_history(session_id: str):
     Get full conversation history for a session
     """
     try:
-        session = conversation_manager.get_session(session_id)
+        session = await conversation_manager.get_session(session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        return ConversationHistoryResponse(
-            session_id=session_id,
-            messages=session["messages"],
-            patient_identified=session["patient_identified"],
-            patient_name=session.get("patient_data", {}).get("patient_name") if session.get("patient_data") else None
-        )
+        return ORJSONResponse({
+            "session_id": session_id,
+            "messages": format_messages(session.messages),
+            "patient_identified": session.patient_identified,
+            "patient_name": session.patient_data.get("patient_name") if session.patient_data else None
+        })
     
     except HTTPException:
         raise
@@ -197,7 +242,7 @@ async def end_chat_session(session_id: str):
     End a chat session
     """
     try:
-        conversation_manager.end_session(session_id)
+        await conversation_manager.end_session(session_id)
         return {"status": "success", "message": "Session ended"}
     except Exception as e:
         logger.error(f"Error ending session: {e}")
@@ -206,31 +251,41 @@ async def end_chat_session(session_id: str):
 
 # ============== Patient Data Endpoints ==============
 
+# Patient records are static once loaded; let clients revalidate with ETags
+_PATIENT_CACHE_CONTROL = "private, max-age=300"
+
+
+def _cached_response(request: Request, payload: Dict, etag: str) -> Response:
+    """Answer 304 when the client's If-None-Match already has this ETag"""
+    headers = {"ETag": etag, "Cache-Control": _PATIENT_CACHE_CONTROL}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )):
+        return Response(status_code=304, headers=headers)
+    
+    return ORJSONResponse(payload, headers=headers)
+
 @app.get("/patients/list")
-async def list_patients():
+async def list_patients(request: Request):
     """
     List all patients in the system
     """
     try:
-        patients = patient_manager.get_all_patients()
-        return {
-            "total": len(patients),
-            "patients": [
-                {
-                    "name": p.get("patient_name"),
-                    "discharge_date": p.get("discharge_date"),
-                    "diagnosis": p.get("primary_diagnosis")
-                }
-                for p in patients
-            ]
-        }
+        patients = patient_manager.get_patient_list()
+        return _cached_response(
+            request,
+            {"total": len(patients), "patients": patients},
+            patient_manager.get_patient_list_etag()
+        )
     except Exception as e:
         logger.error(f"Error listing patients: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/patients/{patient_name}")
-async def get_patient_info(patient_name: str):
+async def get_patient_info(patient_name: str, request: Request):
     """
     Get detailed information for a specific patient
     """
@@ -240,10 +295,11 @@ async def get_patient_info(patient_name: str):
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
         
-        return {
-            "patient": patient,
-            "summary": patient_manager.get_patient_summary(patient)
-        }
+        return _cached_response(
+            request,
+            {"patient": patient, "summary": patient_manager.get_patient_summary(patient)},
+            patient_manager.get_patient_etag(patient)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -253,6 +309,64 @@ async def get_patient_info(patient_name: str):
 
 # ============== Existing Endpoints (PDF Upload, Query, etc.) ==============
 
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Stream a RAG answer as Server-Sent Events
+    
+    Emits token events as Gemini generates, then a final result event with citations
+    """
+    async def event_stream():
+        try:
+            async for event in rag_agent.query_stream(request.question):
+                yield f"data: {json.dumps(jsonable_encoder(event))}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# Upload bodies are copied to disk in pieces of this size
+_UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+def _process_pdf(path: str, file_metadata: Dict) -> int:
+    """Extract, chunk and index a PDF; returns the number of chunks added"""
+    settings = get_settings()
+    text = pdf_processor.get_cached_text(path)
+    
+    if text is None:
+        # Extract, chunk and embed concurrently, a page and a batch at a time
+        chunks = pdf_processor.chunk_stream(
+            prefetch(pdf_processor.iter_pages(path)),
+            chunk_size=settings.CHUNK_SIZE,
+            overlap=settings.CHUNK_OVERLAP
+        )
+        # The stream removes whatever it added on failure, so the fallback can't duplicate chunks
+        pdfium_text = None
+        try:
+            _, chunks_added = vector_store.add_documents_stream(
+                chunks, metadata=file_metadata
+            )
+            return chunks_added
+        except SparseTextError as e:
+            logger.warning(f"Streamed text rejected: {e}")
+            pdfium_text = e.text
+        except Exception as e:
+            logger.warning(f"Streaming extraction failed: {e}")
+        
+        # Fall back to the full extraction cascade, skipping PDFium if the stream already ran it
+        text = pdf_processor.extract_text(path, pdfium_text=pdfium_text)
+    
+    chunks = pdf_processor.chunk_text(
+        text,
+        chunk_size=settings.CHUNK_SIZE,
+        overlap=settings.CHUNK_OVERLAP
+    )
+    return vector_store.add_documents(chunks, metadata=file_metadata)
+
+
 @app.post("/upload-pdf/")
 async def upload_pdf(file: UploadFile = File(...), metadata: Optional[str] = None):
     """Upload and process medical guidelines/documents"""
@@ -262,17 +376,11 @@ async def upload_pdf(file: UploadFile = File(...), metadata: Optional[str] = Non
     try:
         logger.info(f"Processing PDF: {file.filename}")
         
+        # Stream the body to disk rather than buffering the whole PDF in memory
         with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
             tmp_path = tmp_file.name
-        
-        text = pdf_processor.extract_text(tmp_path)
-        chunks = pdf_processor.chunk_text(
-            text,
-            chunk_size=settings.CHUNK_SIZE,
-            overlap=settings.CHUNK_OVERLAP
-        )
+            while chunk := await file.read(_UPLOAD_CHUNK_BYTES):
+                tmp_file.write(chunk)
         
         file_metadata = {
             "filename": file.filename,
@@ -281,13 +389,14 @@ async def upload_pdf(file: UploadFile = File(...), metadata: Optional[str] = Non
         if metadata:
             file_metadata["custom_metadata"] = metadata
         
-        vector_store.add_documents(chunks, metadata=file_metadata)
+        # Extraction and embedding are CPU-bound; keep them off the event loop
+        chunks_created = await run_in_threadpool(_process_pdf, tmp_path, file_metadata)
         os.unlink(tmp_path)
         
         return {
             "status": "success",
             "filename": file.filename,
-            "chunks_created": len(chunks)
+            "chunks_created": chunks_created
         }
     
     except Exception as e:
@@ -309,7 +418,7 @@ async def health_check():
         
         return {
             "status": "healthy",
-            "model": settings.GEMINI_MODEL,
+            "model": get_settings().GEMINI_MODEL,
             "document_count": collection_count,
             "patient_count": patient_count,
             "features": {
@@ -351,7 +460,8 @@ async def root():
                 "get": "GET /patients/{name} - Get patient info"
             },
             "documents": {
-                "upload": "POST /upload-pdf/ - Upload medical guidelines"
+                "upload": "POST /upload-pdf/ - Upload medical guidelines",
+                "query_stream": "POST /query/stream - Stream an answer from the knowledge base"
             }
         }
     }
@@ -359,4 +469,12 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Sessions are only shared between workers through Redis; without it stay single-process
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=os.cpu_count() if get_settings().REDIS_URL else 1,
+        loop="uvloop",
+        http="httptools"
+    )
\ No newline at end of file
@@ -1,11 +1,32 @@
-import json
-from typing import Optional, Dict, List
+import hashlib
+import mmap
+import orjson
+import re
+import sys
+from collections import defaultdict
+from typing import Optional, Dict, FrozenSet, List, Tuple
 from datetime import datetime
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+_PHRASE_SEPARATORS = re.compile(r"[,;\n]")
+_PARENTHETICAL = re.compile(r"\(.*?\)")
+
+
+def _etag(data) -> str:
+    """Quoted HTTP entity tag for JSON-serializable data"""
+    return f'"{hashlib.blake2b(orjson.dumps(data), digest_size=16).hexdigest()}"'
+
+# Common symptom keywords that are warning signs for any patient
+WARNING_KEYWORDS = (
+    'swelling', 'shortness of breath', 'chest pain', 
+    'weight gain', 'fever', 'bleeding', 'pain',
+    'difficulty breathing', 'dizziness', 'confusion'
+)
+_WARNING_PATTERN = re.compile("|".join(map(re.escape, WARNING_KEYWORDS)))
+
 
 class PatientDataManager:
     """Manages patient discharge data"""
@@ -13,6 +34,23 @@ class PatientDataManager:
     def __init__(self, data_file: str = "patients_data.json"):
         self.data_file = data_file
         self.patients = self._load_patients()
+        self._build_name_index()
+        # Keyed by id() of the loaded record; records live as long as the manager
+        self._summaries: Dict[int, str] = {
+            id(patient): self._build_summary(patient) for patient in self.patients
+        }
+        # Slim records served by /patients/list
+        self._list_view = [
+            {
+                "name": p.get("patient_name"),
+                "discharge_date": p.get("discharge_date"),
+                "diagnosis": p.get("primary_diagnosis")
+            }
+            for p in self.patients
+        ]
+        # Records don't change once loaded, so HTTP validators are computed up front
+        self._list_etag = _etag(self._list_view)
+        self._etags: Dict[int, str] = {id(patient): _etag(patient) for patient in self.patients}
         logger.info(f"Loaded {len(self.patients)} patient records")
     
     def _load_patients(self) -> List[Dict]:
@@ -22,13 +60,31 @@ class PatientDataManager:
                 logger.warning(f"Patient data file not found: {self.data_file}")
                 return []
             
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-                return data if isinstance(data, list) else []
+            # Parse straight from the page cache instead of copying into a str first
+            with open(self.data_file, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    data = orjson.loads(view)
+            return data if data.__class__ is list else []
         except Exception as e:
             logger.error(f"Error loading patient data: {e}")
             return []
     
+    def _build_name_index(self):
+        """Index lowercase full names and name tokens for constant-time lookups"""
+        self._by_name: Dict[str, Dict] = {}
+        self._by_token: Dict[str, List[int]] = defaultdict(list)
+        # (lowercase name, name tokens) per patient, for the substring fallback
+        self._name_parts: List[Tuple[str, FrozenSet[str]]] = []
+        
+        for index, patient in enumerate(self.patients):
+            name_lower = sys.intern(patient.get("patient_name", "").lower().strip())
+            tokens = frozenset(sys.intern(token) for token in name_lower.split())
+            # First record wins, as with the original in-order scan
+            self._by_name.setdefault(name_lower, patient)
+            for token in tokens:
+                self._by_token[token].append(index)
+            self._name_parts.append((name_lower, tokens))
+    
     def find_patient(self, name: str) -> Optional[Dict]:
         """
         Find patient by name (fuzzy matching)
@@ -36,19 +92,31 @@ class PatientDataManager:
         name_lower = name.lower().strip()
         
         # Exact match first
-        for patient in self.patients:
-            if patient.get("patient_name", "").lower() == name_lower:
-                return patient
+        patient = self._by_name.get(name_lower)
+        if patient is not None:
+            return patient
+        
+        # Partial match on a whole first or last name; earliest record wins
+        shared_tokens = self._by_token.keys() & name_lower.split()
+        if shared_tokens:
+            return self.patients[min(self._by_token[token][0] for token in shared_tokens)]
         
-        # Partial match (first name or last name)
-        for patient in self.patients:
-            patient_name = patient.get("patient_name", "").lower()
-            if name_lower in patient_name or any(part in name_lower for part in patient_name.split()):
+        # Substring match for partial names
+        for patient, (patient_name, tokens) in zip(self.patients, self._name_parts):
+            if name_lower in patient_name or any(part in name_lower for part in tokens):
                 return patient
         
         return None
     
     def get_patient_summary(self, patient_data: Dict) -> str:
+        """Human-readable summary of patient data, precomputed for loaded records"""
+        summary = self._summaries.get(id(patient_data))
+        if summary is None:
+            # e.g. a record restored from a shared session store
+            summary = self._build_summary(patient_data)
+        return summary
+    
+    def _build_summary(self, patient_data: Dict) -> str:
         """Generate a human-readable summary of patient data"""
         summary = f"""
 **Patient Information**
@@ -77,27 +145,61 @@ Primary Diagnosis: {patient_data.get('primary_diagnosis')}
         """Format list items with bullet points"""
         return "\n".join(f"• {item}" for item in items) if items else "None"
     
-    def check_warning_signs(self, patient_data: Dict, symptom: str) -> bool:
-        """Check if symptom matches warning signs"""
-        warning_signs = patient_data.get('warning_signs', '').lower()
-        symptom_lower = symptom.lower()
+    def compile_warning_signs(self, patient_data: Dict) -> re.Pattern:
+        """
+        Compile a patient's warning signs, plus the common WARNING_KEYWORDS,
+        into a single pattern that replaces the per-message keyword scan
+        Phrases are split on commas, semicolons and newlines, ignoring
+        parenthetical details like "(3+ lbs in 2 days)"
+        """
+        warning_signs = _PARENTHETICAL.sub("", patient_data.get('warning_signs', '').lower())
+        phrases = {
+            phrase.strip() for phrase in _PHRASE_SEPARATORS.split(warning_signs)
+            if phrase.strip()
+        }
+        phrases.update(WARNING_KEYWORDS)
         
-        # Common symptom keywords
-        warning_keywords = [
-            'swelling', 'shortness of breath', 'chest pain', 
-            'weight gain', 'fever', 'bleeding', 'pain',
-            'difficulty breathing', 'dizziness', 'confusion'
-        ]
+        # Longest first so overlapping phrases match the most specific one
+        return re.compile("|".join(map(re.escape, sorted(phrases, key=len, reverse=True))))
+    
+    def check_warning_signs(
+        self, 
+        patient_data: Dict, 
+        symptom: str,
+        warning_pattern: Optional[re.Pattern] = None
+    ) -> bool:
+        """
+        Check if symptom matches warning signs
+        warning_pattern is the compiled output of compile_warning_signs,
+        cached by the caller for the length of a session; it stands in for the
+        keyword scan, and partial mentions of a warning sign are still caught
+        by the substring check
+        """
+        symptom_lower = symptom.lower()
         
-        # Check if symptom is in warning signs
-        if any(keyword in symptom_lower for keyword in warning_keywords):
+        # Common warning keywords (and the patient's own signs) in a single scan
+        keyword_pattern = _WARNING_PATTERN if warning_pattern is None else warning_pattern
+        if keyword_pattern.search(symptom_lower):
             return True
         
-        if symptom_lower in warning_signs:
+        # Partial mentions like "decreased urine" of "decreased urine output"
+        if symptom_lower in patient_data.get('warning_signs', '').lower():
             return True
         
         return False
     
     def get_all_patients(self) -> List[Dict]:
         """Return all patient records"""
-        return self.patients
\ No newline at end of file
+        return self.patients
+    
+    def get_patient_list(self) -> List[Dict]:
+        """Return name, discharge date and diagnosis for every patient (shared, don't mutate)"""
+        return self._list_view
+    
+    def get_patient_list_etag(self) -> str:
+        """ETag for the patient list view"""
+        return self._list_etag
+    
+    def get_patient_etag(self, patient_data: Dict) -> str:
+        """ETag for a patient record, precomputed for loaded records"""
+        return self._etags.get(id(patient_data)) or _etag(patient_data)
\ No newline at end of file
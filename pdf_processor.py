@@ -1,34 +1,286 @@
 import pdfplumber
+import pypdfium2 as pdfium
 from pypdf import PdfReader
-from typing import List, Optional
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+import hashlib
 import logging
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Chunk boundary candidates; lookaheads so overlapping matches (e.g. "\n\n\n") all count
+_PARAGRAPH_BREAK = re.compile(r"(?=\n\n)")
+_SENTENCE_BREAK = re.compile(r"[.?!](?= )")
+_LINE_BREAK = re.compile(r"\n")
+
+# PDFium isn't thread-safe, and extraction runs on background and request threads.
+# Reentrant because an abandoned page generator may be finalized
+# (closing its document) by a thread that is already inside PDFium
+_PDFIUM_LOCK = threading.RLock()
+
+# Minimum extracted characters for a method to count as successful
+_MIN_CONTENT_CHARS = 50
+
+# Below this average a method's output is treated as low-confidence (e.g. scanned pages)
+_MIN_CHARS_PER_PAGE = 200
+
+# Extraction strategy by document size, per backend: rows of
+# (up to this many pages, pages per process-pool task or None to extract serially)
+# PDFium is fast per page, so a pool only pays off for large documents;
+# pdfplumber is far slower per page, so it parallelizes much sooner.
+# There is no thread tier: PDFium isn't thread-safe and pdfplumber holds the GIL
+_EXTRACTION_STRATEGIES = {
+    "pdfium": ((200, None), (None, 50)),
+    "pdfplumber": ((10, None), (None, 25)),
+}
+
+# Pool workers must not be forked from this multi-threaded process: a child forked while
+# another thread holds _PDFIUM_LOCK inherits it locked and hangs. The forkserver is started
+# once with the app preloaded, so workers don't each re-import it; spawn where unavailable
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _POOL_CONTEXT = multiprocessing.get_context("forkserver")
+    _POOL_CONTEXT.set_forkserver_preload(["__main__", __name__])
+else:
+    _POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+class SparseTextError(ValueError):
+    """
+    Streamed PDFium text failed the content check extract_text applies
+    Carries the text so extract_text can keep it as a candidate without rerunning PDFium
+    """
+
+    def __init__(self, message: str, text: str):
+        super().__init__(message)
+        self.text = text
+
+
+def _sparse_content(content_chars: int, page_count: int) -> bool:
+    """Whether output averages too few characters per page to trust (page_count 0: unknown)"""
+    return bool(page_count) and content_chars / page_count < _MIN_CHARS_PER_PAGE
+
+
+@contextmanager
+def _map_file(pdf_path: str) -> Iterator[Optional[mmap.mmap]]:
+    """Read-only memory map of a file, usable as a seekable stream (None if it's empty)"""
+    with open(pdf_path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield None
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+@lru_cache(maxsize=64)
+def _file_digest(pdf_path: str, inode: int, size: int, mtime_ns: int) -> str:
+    """Digest behind RobustPDFProcessor.fingerprint; the stat fields key the memo"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(pdf_path, 'rb') as f:
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return digest.hexdigest()
+
+
+def _format_page(page_num: int, page_text: str) -> str:
+    """Page text with the marker every extraction method puts in front of it"""
+    return f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+
+
+def _pdfium_page_text(pdf, page_num: int) -> str:
+    """Text of one page of an open PDFium document; call with _PDFIUM_LOCK held"""
+    page = pdf[page_num]
+    try:
+        textpage = page.get_textpage()
+        try:
+            # PDFium separates lines with CRLF
+            return textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+
+def _iter_pdfium_pages(
+    pdf_path: str, 
+    start: int = 0, 
+    end: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page index, text) for each non-empty page in [start, end) using PDFium
+    The lock is held per call into PDFium and released between pages, so
+    concurrent extractions interleave page by page
+    """
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(pdf_path)
+        page_count = len(pdf)
+    try:
+        for page_num in range(start, page_count if end is None else end):
+            try:
+                with _PDFIUM_LOCK:
+                    page_text = _pdfium_page_text(pdf, page_num)
+            except Exception as e:
+                logger.warning(f"Failed to extract page {page_num + 1} with PDFium: {e}")
+                continue
+            if page_text.strip():
+                yield page_num, page_text
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+
+def _pdfplumber_pages_text(pdf, start: int, end: int) -> str:
+    """Extract pages [start, end) of an open pdfplumber document"""
+    parts = []
+    for page_num in range(start, end):
+        try:
+            page_text = pdf.pages[page_num].extract_text()
+            if page_text:
+                parts.append(_format_page(page_num, page_text))
+        except Exception as e:
+            logger.warning(f"Failed to extract page {page_num + 1}: {e}")
+            continue
+    return "".join(parts)
+
+
+def _extract_pdfplumber_range(pdf_path: str, start: int, end: int) -> str:
+    """Process pool worker: open the PDF in this process and extract a page range"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return _pdfplumber_pages_text(pdf, start, end)
+
+
+def _extract_pdfium_range(pdf_path: str, start: int, end: int) -> str:
+    """Process pool worker: extract a page range with this process's own PDFium instance"""
+    return "".join(
+        _format_page(page_num, page_text)
+        for page_num, page_text in _iter_pdfium_pages(pdf_path, start, end)
+    )
+
+
+def _pages_per_task(backend: str, page_count: int) -> Optional[int]:
+    """Look up the strategy for a document size; None means extract serially"""
+    for max_pages, pages_per_task in _EXTRACTION_STRATEGIES[backend]:
+        if max_pages is None or page_count <= max_pages:
+            return pages_per_task
+    return None
+
+
+def _extract_in_processes(worker, pdf_path: str, page_count: int, pages_per_task: int) -> str:
+    """Extract fixed-size page ranges in a process pool; map() returns them in page order"""
+    starts = range(0, page_count, pages_per_task)
+    ends = [min(start + pages_per_task, page_count) for start in starts]
+    workers = min(os.cpu_count() or 1, len(starts))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_POOL_CONTEXT) as executor:
+        return "".join(executor.map(worker, [pdf_path] * len(starts), starts, ends))
+
+
 class RobustPDFProcessor:
     """
     Multi-strategy PDF processor with fallback mechanisms
-    Uses pdfplumber as primary and pypdf as fallback
+    Uses PDFium for plain text, then pdfplumber and pypdf as fallbacks
+    Extracted text is cached on disk by file content when cache_dir is set
     """
     
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
     @staticmethod
-    def extract_with_pdfplumber(pdf_path: str) -> Optional[str]:
-        """Primary method using pdfplumber - best for complex PDFs"""
+    def fingerprint(pdf_path: str) -> str:
+        """
+        BLAKE2b digest of the file contents
+        Memoized on the file's identity and modification time, so the cache lookup,
+        streaming ingest and fallback extraction of one upload read the file once
+        """
+        st = os.stat(pdf_path)
+        return _file_digest(pdf_path, st.st_ino, st.st_size, st.st_mtime_ns)
+    
+    def _cache_path(self, pdf_path: str) -> Optional[Path]:
+        """Cache file for a PDF's extracted text, or None when caching is off"""
+        if not self.cache_dir:
+            return None
+        return self.cache_dir / f"{self.fingerprint(pdf_path)}.txt"
+    
+    def get_cached_text(self, pdf_path: str) -> Optional[str]:
+        """Previously extracted text for a PDF with the same contents, if any"""
+        cache_path = self._cache_path(pdf_path)
+        if cache_path and cache_path.exists():
+            logger.info(f"Using cached text for: {pdf_path}")
+            return cache_path.read_text(encoding='utf-8')
+        return None
+    
+    def _write_cache(self, cache_path: Path, text: str):
+        """Write atomically so a concurrent reader never sees a partial file"""
         try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += f"\n--- Page {page_num + 1} ---\n"
-                            text += page_text + "\n"
-                    except Exception as e:
-                        logger.warning(f"Failed to extract page {page_num + 1}: {e}")
-                        continue
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache extracted text: {e}")
+    
+    @staticmethod
+    def _probe_pages(pdf_path: str, stream: Optional[BinaryIO] = None) -> int:
+        """
+        Number of pages, read from the page tree without extracting anything (0 if unknown)
+        pypdf only parses the xref and page tree for this
+        """
+        try:
+            return len(PdfReader(pdf_path if stream is None else stream, strict=False).pages)
+        except Exception:
+            return 0
+    
+    @classmethod
+    def extract_with_pdfium(cls, pdf_path: str, page_count: Optional[int] = None) -> Optional[str]:
+        """
+        Fastest method using PDFium - plain text without building a layout tree
+        Large documents are split across worker processes (see _EXTRACTION_STRATEGIES)
+        """
+        try:
+            if page_count is None:
+                page_count = cls._probe_pages(pdf_path)
+            pages_per_task = _pages_per_task("pdfium", page_count)
+            
+            if pages_per_task and (os.cpu_count() or 1) > 1:
+                text = _extract_in_processes(_extract_pdfium_range, pdf_path, page_count, pages_per_task)
+            else:
+                text = _extract_pdfium_range(pdf_path, 0, None)
+            return text if text.strip() else None
+        except Exception as e:
+            logger.warning(f"PDFium extraction failed: {e}")
+            return None
+    
+    @staticmethod
+    def extract_with_pdfplumber(pdf_path: str, stream: Optional[BinaryIO] = None) -> Optional[str]:
+        """
+        Primary method using pdfplumber - best for complex PDFs
+        Pages are independent, so larger documents are split into page ranges
+        extracted in parallel worker processes (small ones aren't worth the pool startup)
+        Workers reopen pdf_path; stream is only read in this process
+        """
+        try:
+            with pdfplumber.open(pdf_path if stream is None else stream) as pdf:
+                page_count = len(pdf.pages)
+                pages_per_task = _pages_per_task("pdfplumber", page_count)
+                parallel = bool(pages_per_task) and (os.cpu_count() or 1) > 1
+                if not parallel:
+                    text = _pdfplumber_pages_text(pdf, 0, page_count)
+            
+            if parallel:
+                text = _extract_in_processes(_extract_pdfplumber_range, pdf_path, page_count, pages_per_task)
             
             return text if text.strip() else None
         except Exception as e:
@@ -36,65 +288,66 @@ class RobustPDFProcessor:
             return None
     
     @staticmethod
-    def extract_with_pdfplumber_layout(pdf_path: str) -> Optional[str]:
+    def extract_with_pdfplumber_layout(pdf_path: str, stream: Optional[BinaryIO] = None) -> Optional[str]:
         """Alternative pdfplumber method preserving layout"""
         try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
+            parts = []
+            with pdfplumber.open(pdf_path if stream is None else stream) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     try:
                         # Use layout mode for better structure preservation
                         page_text = page.extract_text(layout=True)
                         if page_text:
-                            text += f"\n--- Page {page_num + 1} ---\n"
-                            text += page_text + "\n"
+                            parts.append(_format_page(page_num, page_text))
                     except Exception as e:
                         logger.warning(f"Failed to extract page {page_num + 1} with layout: {e}")
                         continue
             
+            text = "".join(parts)
             return text if text.strip() else None
         except Exception as e:
             logger.warning(f"pdfplumber layout extraction failed: {e}")
             return None
     
     @staticmethod
-    def extract_with_pypdf(pdf_path: str) -> Optional[str]:
+    def extract_with_pypdf(pdf_path: str, stream: Optional[BinaryIO] = None) -> Optional[str]:
         """Fallback method using pypdf - works with damaged PDFs"""
         try:
             # Non-strict mode handles EOF and other errors
-            reader = PdfReader(pdf_path, strict=False)
-            text = ""
+            reader = PdfReader(pdf_path if stream is None else stream, strict=False)
+            parts = []
             
             for page_num, page in enumerate(reader.pages):
                 try:
                     page_text = page.extract_text()
                     if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n"
-                        text += page_text + "\n"
+                        parts.append(_format_page(page_num, page_text))
                 except Exception as e:
                     logger.warning(f"Failed to extract page {page_num + 1}: {e}")
                     continue
             
+            text = "".join(parts)
             return text if text.strip() else None
         except Exception as e:
             logger.warning(f"pypdf extraction failed: {e}")
             return None
     
     @staticmethod
-    def extract_with_pypdf_recovery(pdf_path: str) -> Optional[str]:
+    def extract_with_pypdf_recovery(pdf_path: str, stream: Optional[BinaryIO] = None) -> Optional[str]:
         """Last resort - pypdf with maximum error recovery"""
         try:
-            with open(pdf_path, 'rb') as file:
+            with open(pdf_path, 'rb') if stream is None else nullcontext(stream) as file:
                 reader = PdfReader(file, strict=False)
-                text = ""
+                parts = []
                 
                 # Try to read metadata
                 try:
                     if reader.metadata:
-                        text += "--- Document Metadata ---\n"
+                        metadata = ["--- Document Metadata ---\n"]
                         for key, value in reader.metadata.items():
-                            text += f"{key}: {value}\n"
-                        text += "\n"
+                            metadata.append(f"{key}: {value}\n")
+                        metadata.append("\n")
+                        parts.extend(metadata)
                 except:
                     pass
                 
@@ -104,90 +357,181 @@ class RobustPDFProcessor:
                         page = reader.pages[page_num]
                         page_text = page.extract_text()
                         if page_text:
-                            text += f"\n--- Page {page_num + 1} ---\n"
-                            text += page_text + "\n"
+                            parts.append(_format_page(page_num, page_text))
                     except Exception as e:
                         logger.warning(f"Recovery mode failed on page {page_num + 1}: {e}")
-                        text += f"\n--- Page {page_num + 1} (Recovery Failed) ---\n"
+                        parts.append(f"\n--- Page {page_num + 1} (Recovery Failed) ---\n")
                         continue
                 
+                text = "".join(parts)
                 return text if text.strip() else None
         except Exception as e:
             logger.warning(f"pypdf recovery extraction failed: {e}")
             return None
     
-    def extract_text(self, pdf_path: str) -> str:
+    def extract_text(
+        self, 
+        pdf_path: str, 
+        layout: bool = False, 
+        pdfium_text: Optional[str] = None
+    ) -> str:
         """
         Extract text with multiple fallback strategies
-        Tries 4 different methods in order
+        
+        Output that passes the minimum but averages under _MIN_CHARS_PER_PAGE per page
+        escalates to a different parser instead of retrying the same one; the
+        densest output is used if nothing does better.
+        pdfplumber's slower layout mode only runs when layout=True (table-heavy
+        documents), in which case it is tried first and the cache is bypassed
+        pdfium_text is PDFium output already read (e.g. from a SparseTextError);
+        it is checked in PDFium's place instead of extracting again
         """
         if not Path(pdf_path).exists():
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
         
+        cache_path = None
+        if not layout:
+            cached = self.get_cached_text(pdf_path)
+            if cached is not None:
+                return cached
+            cache_path = self._cache_path(pdf_path)
+        
         logger.info(f"Starting PDF extraction for: {pdf_path}")
         
-        # Try methods in order of reliability for complex PDFs
-        methods = [
-            ("pdfplumber (default)", self.extract_with_pdfplumber),
-            ("pdfplumber (layout)", self.extract_with_pdfplumber_layout),
-            ("pypdf (non-strict)", self.extract_with_pypdf),
-            ("pypdf (recovery)", self.extract_with_pypdf_recovery),
-        ]
+        # Map the file once and let the pypdf/pdfplumber methods share it through the
+        # page cache (PDFium reads the path natively, pool workers reopen it)
+        with _map_file(pdf_path) as stream:
+            # One cheap probe sizes the document for both the parallelism choice
+            # and the content density check
+            page_count = self._probe_pages(pdf_path, stream)
+            
+            # Try methods in order of reliability for complex PDFs
+            # (name, method, parser) - sparse output skips the rest of that parser's methods
+            if pdfium_text is None:
+                pdfium = partial(self.extract_with_pdfium, page_count=page_count)
+            else:
+                pdfium = lambda _: pdfium_text
+            methods = [
+                ("pdfium", pdfium, "pdfium"),
+                ("pdfplumber (default)", partial(self.extract_with_pdfplumber, stream=stream), "pdfplumber"),
+                ("pypdf (non-strict)", partial(self.extract_with_pypdf, stream=stream), "pypdf"),
+                ("pypdf (recovery)", partial(self.extract_with_pypdf_recovery, stream=stream), "pypdf"),
+            ]
+            if layout:
+                methods.insert(0, (
+                    "pdfplumber (layout)", 
+                    partial(self.extract_with_pdfplumber_layout, stream=stream), 
+                    "pdfplumber"
+                ))
+            
+            sparse_parsers = set()
+            best_name, best_text = None, None
+            
+            for method_name, method, parser in methods:
+                if parser in sparse_parsers:
+                    continue
+            
+                logger.info(f"Trying extraction with {method_name}...")
+                try:
+                    text = method(pdf_path)
+                    content_chars = len(text.strip()) if text else 0
+                    if content_chars <= _MIN_CONTENT_CHARS:
+                        logger.warning(f"   Insufficient content extracted")
+                        continue
+            
+                    if best_text is None or content_chars > len(best_text.strip()):
+                        best_name, best_text = method_name, text
+            
+                    if _sparse_content(content_chars, page_count):
+                        logger.warning(
+                            f"   Sparse content ({content_chars // page_count} chars/page), "
+                            f"trying another parser"
+                        )
+                        sparse_parsers.add(parser)
+                        continue
+            
+                    break
+                except Exception as e:
+                    logger.error(f"   Exception in {method_name}: {e}")
+                    continue
         
-        for method_name, method in methods:
-            logger.info(f"Trying extraction with {method_name}...")
-            try:
-                text = method(pdf_path)
-                if text and len(text.strip()) > 50:  # Minimum content threshold
-                    logger.info(f"✅ Successfully extracted with {method_name}")
-                    logger.info(f"   Extracted {len(text)} characters")
-                    return text
-                else:
-                    logger.warning(f"   Insufficient content extracted")
-            except Exception as e:
-                logger.error(f"   Exception in {method_name}: {e}")
-                continue
+        if best_text is None:
+            raise ValueError(
+                "Failed to extract text from PDF with all methods. "
+                "The PDF might be image-based, encrypted, or severely corrupted."
+            )
         
-        raise ValueError(
-            "Failed to extract text from PDF with all methods. "
-            "The PDF might be image-based, encrypted, or severely corrupted."
-        )
+        logger.info(f"✅ Successfully extracted with {best_name}")
+        logger.info(f"   Extracted {len(best_text)} characters")
+        if cache_path:
+            self._write_cache(cache_path, best_text)
+        return best_text
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, 
-                   overlap: int = 200) -> List[str]:
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
         """
-        Split text into overlapping chunks with smart boundary detection
+        Yield (page index, text) page by page with PDFium, for streaming ingestion
+        Once every page has been read the full text gets extract_text's content check:
+        it is cached if it passes; otherwise SparseTextError is raised, so the
+        consumer can discard what it ingested and escalate to the other parsers
         """
-        if not text or not text.strip():
-            return []
+        parts = []
+        
+        for page_num, page_text in _iter_pdfium_pages(pdf_path):
+            parts.append(_format_page(page_num, page_text))
+            yield page_num, page_text
         
+        text = "".join(parts)
+        content_chars = len(text.strip())
+        if content_chars <= _MIN_CONTENT_CHARS:
+            raise SparseTextError("Insufficient content extracted with PDFium", text)
+        page_count = self._probe_pages(pdf_path)
+        if _sparse_content(content_chars, page_count):
+            raise SparseTextError(
+                f"Sparse content ({content_chars // page_count} chars/page) extracted with PDFium",
+                text
+            )
+        
+        cache_path = self._cache_path(pdf_path)
+        if cache_path:
+            self._write_cache(cache_path, text)
+    
+    @staticmethod
+    def _split_windows(
+        text: str, 
+        start: int, 
+        chunk_size: int, 
+        overlap: int, 
+        final: bool
+    ) -> Tuple[List[str], int]:
+        """
+        Cut overlapping chunks from text[start:] with smart boundary detection
+        Unless final, stops at the first window that reaches the end of the text
+        (more text may follow) and returns its start along with the chunks
+        """
         chunks = []
-        start = 0
         text_length = len(text)
         
+        # Break candidates are found in one pass over the text; each window then
+        # binary-searches for the last one that fits inside it.
+        # (positions, match width) in order of preference
+        break_positions = (
+            ([m.start() for m in _PARAGRAPH_BREAK.finditer(text)], 2),
+            ([m.start() for m in _SENTENCE_BREAK.finditer(text)], 2),
+            ([m.start() for m in _LINE_BREAK.finditer(text)], 1),
+        )
+        
         while start < text_length:
             end = start + chunk_size
+            if end >= text_length and not final:
+                break
             chunk = text[start:end]
             
-            # Try to break at natural boundaries
+            # Try to break at natural boundaries: the last paragraph break,
+            # then sentence break, then newline past the middle of the window
             if end < text_length:
-                # Look for paragraph breaks first
-                last_double_newline = chunk.rfind('\n\n')
-                # Then sentence breaks
-                last_period = chunk.rfind('. ')
-                last_question = chunk.rfind('? ')
-                last_exclamation = chunk.rfind('! ')
-                # Then any newline
-                last_newline = chunk.rfind('\n')
-                
-                # Choose the best break point
-                break_points = [
-                    last_double_newline,
-                    max(last_period, last_question, last_exclamation),
-                    last_newline
-                ]
-                
-                for break_point in break_points:
+                for positions, width in break_positions:
+                    idx = bisect_right(positions, end - width) - 1
+                    break_point = positions[idx] - start if idx >= 0 else -1
                     if break_point > chunk_size * 0.5:  # At least 50% of chunk
                         chunk = chunk[:break_point + 1]
                         end = start + break_point + 1
@@ -199,24 +543,56 @@ class RobustPDFProcessor:
             
             start = end - overlap
         
-        logger.info(f"Created {len(chunks)} chunks from {text_length} characters")
+        return chunks, start
+    
+    def chunk_text(self, text: str, chunk_size: int = 1000, 
+                   overlap: int = 200) -> List[str]:
+        """
+        Split text into overlapping chunks with smart boundary detection
+        """
+        if not text or not text.strip():
+            return []
+        
+        chunks, _ = self._split_windows(text, 0, chunk_size, overlap, final=True)
+        
+        logger.info(f"Created {len(chunks)} chunks from {len(text)} characters")
         return chunks
     
-    def extract_tables(self, pdf_path: str) -> List[dict]:
+    def chunk_stream(self, pages: Iterable[Tuple[int, str]], chunk_size: int = 1000,
+                     overlap: int = 200) -> Iterator[str]:
+        """
+        Chunk pages as they arrive, yielding the same chunks chunk_text gives for the whole text
+        Only the text that hasn't been chunked yet is kept in memory
+        """
+        buffer = ""
+        for page_num, page_text in pages:
+            buffer += _format_page(page_num, page_text)
+            chunks, start = self._split_windows(buffer, 0, chunk_size, overlap, final=False)
+            yield from chunks
+            buffer = buffer[start:]
+        
+        chunks, _ = self._split_windows(buffer, 0, chunk_size, overlap, final=True)
+        yield from chunks
+    
+    def extract_tables(self, pdf_path: str, pages: Optional[Iterable[int]] = None) -> List[dict]:
         """
         Extract tables from PDF using pdfplumber
+        pages limits extraction to those 1-based page numbers (all pages when None)
         Returns list of tables as dictionaries
         """
         tables = []
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    page_tables = page.extract_tables()
-                    for table_num, table in enumerate(page_tables):
+            # pdfplumber only builds the selected pages
+            page_numbers = sorted(set(pages)) if pages is not None else None
+            with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+                for page in pdf.pages:
+                    # Detect table structure once and extract cells from what was found,
+                    # so pages without tables cost only the detection pass
+                    for table_num, table in enumerate(page.find_tables()):
                         tables.append({
-                            "page": page_num + 1,
+                            "page": page.page_number,
                             "table_number": table_num + 1,
-                            "data": table
+                            "data": table.extract()
                         })
             logger.info(f"Extracted {len(tables)} tables from PDF")
         except Exception as e:
@@ -0,0 +1,96 @@
+from typing import Iterable, Iterator, Optional
+import queue
+import threading
+
+# Marks the end of a producer's output
+_DONE = object()
+
+# How often a producer blocked on a full queue checks whether it should stop
+_PUT_POLL_SECONDS = 0.1
+
+
+class _ProducerError:
+    """Carries an exception raised by a producer over to the consuming thread"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(items: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put into a bounded queue, giving up (False) once stop is set"""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=_PUT_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def produce(
+    iterable: Iterable,
+    maxsize: int = 64,
+    stop: Optional[threading.Event] = None
+) -> queue.Queue:
+    """
+    Iterate in a background thread, feeding items into a bounded queue
+    The bound gives backpressure: the producer blocks while the consumer is behind
+    Setting stop makes the producer close its iterator and exit, so a consumer
+    that gives up doesn't leave the thread blocked on a full queue
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = stop or threading.Event()
+
+    def run():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not _put(items, item, stop):
+                    return
+        except BaseException as e:
+            _put(items, _ProducerError(e), stop)
+        else:
+            _put(items, _DONE, stop)
+        finally:
+            # Runs generator cleanup (e.g. closing an open document) in this thread
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return items
+
+
+def take(items: queue.Queue, timeout: Optional[float] = None):
+    """
+    Next item from a produce() queue
+    Raises queue.Empty on timeout, StopIteration once the producer is done
+    and re-raises any exception the producer hit
+    """
+    item = items.get(timeout=timeout)
+    if item is _DONE:
+        raise StopIteration
+    if isinstance(item, _ProducerError):
+        raise item.error
+    return item
+
+
+def consume(items: queue.Queue, stop: Optional[threading.Event] = None) -> Iterator:
+    """Iterate over a produce() queue, stopping the producer if iteration ends early"""
+    try:
+        while True:
+            try:
+                yield take(items)
+            except StopIteration:
+                return
+    finally:
+        if stop is not None:
+            stop.set()
+
+
+def prefetch(iterable: Iterable, maxsize: int = 64) -> Iterator:
+    """Run an iterable one stage ahead of its consumer in a background thread"""
+    stop = threading.Event()
+    return consume(produce(iterable, maxsize, stop), stop)
@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Dict, List, Optional
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheBucket:
+    """Embeddings and results for a single cache namespace"""
+
+    __slots__ = ("matrix", "entries", "expires_at")
+
+    def __init__(self, dim: int):
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.entries: List[Dict] = []
+        self.expires_at = np.empty(0, dtype=np.float64)
+
+
+class SemanticCache:
+    """
+    Caches query results keyed by normalized query embedding
+    A new query hits when its cosine similarity to a stored query
+    is above the threshold and the stored entry has not expired
+    """
+
+    def __init__(
+        self, 
+        threshold: float = 0.92, 
+        ttl: int = 3600, 
+        max_entries: int = 512,
+        dim: int = 384
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.dim = dim
+
+        # Namespaces keep patient-specific answers isolated from each other
+        self._buckets: Dict[Optional[str], _CacheBucket] = {}
+
+    def lookup(self, embedding: np.ndarray, namespace: Optional[str] = None) -> Optional[Dict]:
+        """Return the cached result for the closest stored query, if similar enough"""
+        bucket = self._buckets.get(namespace)
+        if bucket is None or not bucket.entries:
+            return None
+
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        sims = bucket.matrix @ embedding
+        sims[bucket.expires_at <= time.time()] = -1.0
+
+        idx = int(np.argmax(sims))
+        if sims[idx] < self.threshold:
+            return None
+
+        logger.info(f"Semantic cache hit (similarity {sims[idx]:.3f})")
+        return bucket.entries[idx]
+
+    def add(self, embedding: np.ndarray, result: Dict, namespace: Optional[str] = None):
+        """Store a result under its query embedding"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.shape != (self.dim,):
+            logger.warning(f"Not caching embedding of shape {embedding.shape}, expected ({self.dim},)")
+            return
+        
+        bucket = self._buckets.get(namespace)
+        if bucket is None:
+            bucket = self._buckets[namespace] = _CacheBucket(self.dim)
+
+        self._evict(bucket)
+
+        bucket.matrix = np.vstack([bucket.matrix, embedding[np.newaxis, :]])
+        bucket.entries.append(result)
+        bucket.expires_at = np.append(bucket.expires_at, time.time() + self.ttl)
+
+    def _evict(self, bucket: _CacheBucket):
+        """Drop expired entries, then the oldest ones if the bucket is full"""
+        keep = bucket.expires_at > time.time()
+
+        overflow = int(keep.sum()) - self.max_entries + 1
+        if overflow > 0:
+            # Entries are appended in insertion order, so the oldest come first
+            keep[np.flatnonzero(keep)[:overflow]] = False
+
+        if keep.all():
+            return
+
+        bucket.matrix = bucket.matrix[keep]
+        bucket.entries = [entry for entry, kept in zip(bucket.entries, keep) if kept]
+        bucket.expires_at = bucket.expires_at[keep]
+
+    def clear(self):
+        """Remove all cached entries"""
+        self._buckets.clear()
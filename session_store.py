@@ -0,0 +1,208 @@
+from typing import Deque, Dict, List, Optional
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+import sys
+import time
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Session:
+    """State of one conversation"""
+    created_ns: int
+    messages: Deque[Dict] = field(default_factory=deque)
+    patient_identified: bool = False
+    patient_data: Optional[Dict] = None
+    current_agent: str = "receptionist"
+
+
+class InMemorySessionStore:
+    """
+    Keeps sessions in a dict on this process
+    Only suitable for a single worker; sessions live until deleted
+    Messages are kept in a bounded deque, so the oldest turns drop off first
+    """
+
+    def __init__(self, max_messages: int = 200):
+        self._sessions: Dict[str, Session] = {}
+        self.max_messages = max_messages
+
+    async def create(self, session_id: str, session: Session):
+        """Store a new session"""
+        session.messages = deque(session.messages, maxlen=self.max_messages)
+        self._sessions[session_id] = session
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        """Get a session, including its messages"""
+        return self._sessions.get(session_id)
+
+    async def update(self, session_id: str, **fields):
+        """Overwrite top-level session fields"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            for name, value in fields.items():
+                setattr(session, name, value)
+
+    async def append_message(self, session_id: str, message: Dict):
+        """Append a message to the session history"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.messages.append(message)
+
+    async def delete(self, session_id: str) -> bool:
+        """Remove a session; returns whether it existed"""
+        return self._sessions.pop(session_id, None) is not None
+
+    async def stale_sessions(self, max_idle_ns: int) -> List[str]:
+        """IDs of sessions with no activity in the last max_idle_ns nanoseconds"""
+        cutoff = time.time_ns() - max_idle_ns
+        return [
+            session_id for session_id, session in self._sessions.items()
+            if (session.messages[-1]["ts_ns"] if session.messages else session.created_ns) < cutoff
+        ]
+
+
+class RedisSessionStore:
+    """
+    Keeps sessions in Redis so every worker sees the same state
+
+    Each session is a hash at session:{id} plus a list of JSON messages at
+    session:{id}:messages; both keys expire `ttl` seconds after the last write
+    The message list is trimmed to the newest `max_messages` entries
+    """
+
+    # Hash fields stored as JSON because they aren't plain strings
+    # (orjson also serializes the RAG Citation dataclasses inside messages)
+    _JSON_FIELDS = ("patient_identified", "patient_data")
+
+    # Fields create() writes; a hash missing any of them isn't a usable session
+    _SESSION_FIELDS = ("created_ns", "patient_identified", "patient_data", "current_agent")
+
+    # Writes to an existing session only: run atomically, so a session deleted or
+    # expired in the meantime isn't recreated as a partial hash
+    # KEYS: session hash, message list; ARGV: ttl, then the command's arguments
+    _UPDATE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+    return 1
+    """
+    _APPEND_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+    redis.call('LTRIM', KEYS[2], -tonumber(ARGV[3]), -1)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, url: str, ttl: int = 3600, max_messages: int = 200):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._update = self._redis.register_script(self._UPDATE_SCRIPT)
+        self._append = self._redis.register_script(self._APPEND_SCRIPT)
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    @staticmethod
+    def _messages_key(session_id: str) -> str:
+        return f"session:{session_id}:messages"
+
+    def _encode_fields(self, fields: Dict) -> Dict:
+        return {
+            name: orjson.dumps(value) if name in self._JSON_FIELDS else value
+            for name, value in fields.items()
+        }
+
+    def _touch(self, pipe, session_id: str):
+        """Queue TTL refreshes for both session keys"""
+        pipe.expire(self._session_key(session_id), self.ttl)
+        pipe.expire(self._messages_key(session_id), self.ttl)
+
+    async def create(self, session_id: str, session: Session):
+        """Store a new session"""
+        fields = {
+            "created_ns": session.created_ns,
+            "patient_identified": session.patient_identified,
+            "patient_data": session.patient_data,
+            "current_agent": session.current_agent
+        }
+
+        pipe = self._redis.pipeline()
+        pipe.hset(self._session_key(session_id), mapping=self._encode_fields(fields))
+        for message in session.messages:
+            pipe.rpush(self._messages_key(session_id), orjson.dumps(message))
+        pipe.ltrim(self._messages_key(session_id), -self.max_messages, -1)
+        self._touch(pipe, session_id)
+        await pipe.execute()
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        """Get a session, including its messages"""
+        pipe = self._redis.pipeline()
+        pipe.hgetall(self._session_key(session_id))
+        pipe.lrange(self._messages_key(session_id), 0, -1)
+        fields, messages = await pipe.execute()
+
+        # Missing, or a leftover fragment of a session that has since been deleted
+        if not all(name in fields for name in self._SESSION_FIELDS):
+            return None
+
+        return Session(
+            created_ns=int(fields["created_ns"]),
+            messages=deque(map(orjson.loads, messages), maxlen=self.max_messages),
+            patient_identified=orjson.loads(fields["patient_identified"]),
+            patient_data=orjson.loads(fields["patient_data"]),
+            # Share one string object per agent name, as in-process sessions do
+            current_agent=sys.intern(fields["current_agent"])
+        )
+
+    async def update(self, session_id: str, **fields):
+        """Overwrite top-level session fields; does nothing if the session is gone"""
+        args = [self.ttl]
+        for name, value in self._encode_fields(fields).items():
+            args += (name, value)
+        await self._update(
+            keys=[self._session_key(session_id), self._messages_key(session_id)],
+            args=args
+        )
+
+    async def append_message(self, session_id: str, message: Dict):
+        """Append a message to the session history; does nothing if the session is gone"""
+        await self._append(
+            keys=[self._session_key(session_id), self._messages_key(session_id)],
+            args=[self.ttl, orjson.dumps(message), self.max_messages]
+        )
+
+    async def delete(self, session_id: str) -> bool:
+        """Remove a session; returns whether it existed"""
+        deleted = await self._redis.delete(
+            self._session_key(session_id),
+            self._messages_key(session_id)
+        )
+        return deleted > 0
+
+    async def stale_sessions(self, max_idle_ns: int) -> List[str]:
+        """
+        Always empty: idle sessions expire through their Redis TTL
+        (each worker drops its own per-session state by idle time separately)
+        """
+        return []
+
+
+def create_session_store(redis_url: str = "", ttl: int = 3600, max_messages: int = 200):
+    """Use Redis when a URL is configured, otherwise fall back to process memory"""
+    if redis_url:
+        logger.info("Using Redis session store")
+        return RedisSessionStore(redis_url, ttl=ttl, max_messages=max_messages)
+
+    logger.info("Using in-memory session store")
+    return InMemorySessionStore(max_messages=max_messages)
@@ -1,21 +1,27 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
 BASE_URL = "http://localhost:8000"
 
+# One pooled keep-alive connection for the whole conversation
+SESSION = requests.Session()
+SESSION.headers.update({'Accept-Encoding': 'gzip'})
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
 def test_full_conversation():
     """Test complete conversation flow"""
     
     # 1. Start conversation
     print("=== Starting Conversation ===")
-    response = requests.post(f"{BASE_URL}/chat/start")
+    response = SESSION.post(f"{BASE_URL}/chat/start")
     data = response.json()
     session_id = data["session_id"]
     print(f"Bot: {data['message']}\n")
     
     # 2. Provide name
     print("=== Patient Identification ===")
-    response = requests.post(
+    response = SESSION.post(
         f"{BASE_URL}/chat/message",
         json={
             "session_id": session_id,
@@ -27,7 +33,7 @@ def test_full_conversation():
     
     # 3. General query
     print("=== General Query ===")
-    response = requests.post(
+    response = SESSION.post(
         f"{BASE_URL}/chat/message",
         json={
             "session_id": session_id,
@@ -39,7 +45,7 @@ def test_full_conversation():
     
     # 4. Medical concern (warning sign)
     print("=== Medical Concern (Warning Sign) ===")
-    response = requests.post(
+    response = SESSION.post(
         f"{BASE_URL}/chat/message",
         json={
             "session_id": session_id,
@@ -57,7 +63,7 @@ def test_full_conversation():
     
     # 5. Research question (likely triggers web search)
     print("=== Research Question ===")
-    response = requests.post(
+    response = SESSION.post(
         f"{BASE_URL}/chat/message",
         json={
             "session_id": session_id,
@@ -71,7 +77,7 @@ def test_full_conversation():
     
     # 6. Get conversation history
     print("=== Conversation History ===")
-    response = requests.get(f"{BASE_URL}/chat/history/{session_id}")
+    response = SESSION.get(f"{BASE_URL}/chat/history/{session_id}")
     history = response.json()
     print(f"Total messages: {len(history['messages'])}")
     print(f"Patient identified: {history['patient_identified']}")
@@ -0,0 +1,58 @@
+import pytest
+
+from patient_data_manager import PatientDataManager, WARNING_KEYWORDS
+
+
+@pytest.fixture(scope="module")
+def manager():
+    return PatientDataManager("patients_data.json")
+
+
+def _baseline_check(patient_data, symptom):
+    """The per-message keyword scan and substring check the compiled pattern must cover"""
+    warning_signs = patient_data.get('warning_signs', '').lower()
+    symptom_lower = symptom.lower()
+    if any(keyword in symptom_lower for keyword in WARNING_KEYWORDS):
+        return True
+    return symptom_lower in warning_signs
+
+
+def _fragments(text):
+    """Every run of consecutive words in a warning-signs string"""
+    words = text.split()
+    return {
+        " ".join(words[start:end]).strip(",;()")
+        for start in range(len(words))
+        for end in range(start + 1, len(words) + 1)
+    }
+
+
+@pytest.mark.parametrize("name, symptom", [
+    ("John Smith", "decreased urine"),
+    ("John Smith", "urine output"),
+    ("Sarah Johnson", "sudden weight"),
+])
+def test_partial_warning_sign_mentions(manager, name, symptom):
+    """Fragments of a patient's own warning signs are flagged"""
+    patient = manager.find_patient(name)
+    pattern = manager.compile_warning_signs(patient)
+    assert manager.check_warning_signs(patient, symptom, pattern)
+
+
+def test_compiled_pattern_covers_baseline(manager):
+    """Everything the per-message scan flagged is still flagged with the compiled pattern"""
+    for patient in manager.get_all_patients():
+        pattern = manager.compile_warning_signs(patient)
+        symptoms = _fragments(patient.get('warning_signs', '')) | set(WARNING_KEYWORDS)
+        symptoms |= {f"I have {keyword} since yesterday" for keyword in WARNING_KEYWORDS}
+        for symptom in symptoms:
+            if _baseline_check(patient, symptom):
+                assert manager.check_warning_signs(patient, symptom, pattern), (
+                    patient["patient_name"], symptom
+                )
+
+
+def test_unrelated_message_not_flagged(manager):
+    patient = manager.find_patient("John Smith")
+    pattern = manager.compile_warning_signs(patient)
+    assert not manager.check_warning_signs(patient, "What time is my appointment?", pattern)
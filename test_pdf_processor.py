@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import pdf_processor
+
+
+def _write_pdf(path, pages):
+    """Minimal uncompressed PDF with one line of Helvetica text per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page_num in range(pages):
+        content = b"BT /F1 12 Tf 72 720 Td (Discharge instructions page %d) Tj ET" % (page_num + 1)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages
+    )
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(out)
+
+
+@pytest.fixture
+def pdf_lock_held():
+    """Hold _PDFIUM_LOCK from another thread, as a concurrent extraction would"""
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with pdf_processor._PDFIUM_LOCK:
+            acquired.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold, daemon=True)
+    holder.start()
+    acquired.wait()
+    yield
+    release.set()
+    holder.join()
+
+
+def test_process_pool_extraction_while_lock_held(tmp_path, pdf_lock_held):
+    """Pool workers get their own unlocked PDFium lock instead of inheriting a held one"""
+    pdf_path = tmp_path / "discharge.pdf"
+    _write_pdf(pdf_path, pages=6)
+    result = {}
+
+    def extract():
+        result["text"] = pdf_processor._extract_in_processes(
+            pdf_processor._extract_pdfium_range, str(pdf_path), page_count=6, pages_per_task=2
+        )
+
+    worker = threading.Thread(target=extract, daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    assert not worker.is_alive(), "process pool extraction hung on the inherited lock"
+
+    text = result["text"]
+    for page_num in range(6):
+        assert f"--- Page {page_num + 1} ---" in text
+        assert f"Discharge instructions page {page_num + 1}" in text
+
+
+def test_sparse_stream_is_rejected_and_not_cached(tmp_path):
+    """Streamed text gets the same content check as extract_text before it's cached"""
+    pdf_path = tmp_path / "sparse.pdf"
+    _write_pdf(pdf_path, pages=3)
+    processor = pdf_processor.RobustPDFProcessor(cache_dir=str(tmp_path / "cache"))
+
+    with pytest.raises(pdf_processor.SparseTextError) as excinfo:
+        list(processor.iter_pages(str(pdf_path)))
+
+    assert "Discharge instructions page 3" in excinfo.value.text
+    assert processor.get_cached_text(str(pdf_path)) is None
+
+
+def test_extract_text_reuses_streamed_pdfium_text(tmp_path, monkeypatch):
+    """Escalation after a sparse stream goes straight to the other parsers"""
+    pdf_path = tmp_path / "sparse.pdf"
+    _write_pdf(pdf_path, pages=3)
+    processor = pdf_processor.RobustPDFProcessor()
+    with pytest.raises(pdf_processor.SparseTextError) as excinfo:
+        list(processor.iter_pages(str(pdf_path)))
+
+    reruns = []
+    monkeypatch.setattr(processor, "extract_with_pdfium", lambda *args, **kwargs: reruns.append(args))
+    text = processor.extract_text(str(pdf_path), pdfium_text=excinfo.value.text)
+    assert not reruns
+    for page_num in range(3):
+        assert f"Discharge instructions page {page_num + 1}" in text
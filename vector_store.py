@@ -1,26 +1,33 @@
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
-import uuid
-from config import settings
+from typing import Iterable, List, Dict, Tuple
+from collections import OrderedDict
+import hashlib
+import queue
+import threading
+import time
+import numpy as np
+import torch
+from config import get_settings
+from embeddings import get_embedder
+from pipeline import produce, take
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class VectorStore:
-    def __init__(self):
+    def __init__(self, query_cache_size: int = 1024):
         self.client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIR,
+            path=get_settings().CHROMA_PERSIST_DIR,
             settings=ChromaSettings(
                 anonymized_telemetry=False,
                 allow_reset=True
             )
         )
         
-        # Initialize sentence transformer
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        # Shared sentence transformer (loaded once per process)
+        self.embedding_model = get_embedder()
         
         # Create or get collection
         self.collection = self.client.get_or_create_collection(
@@ -28,26 +35,95 @@ class VectorStore:
             metadata={"hnsw:space": "cosine"}
         )
         
+        # OnnxEmbedder has no torch device; it always runs on CPU
+        device = getattr(self.embedding_model, "device", None)
+        self._on_cuda = getattr(device, "type", None) == "cuda"
+        
         # ChromaDB batch size limit
         self.max_batch_size = 5000  # Safe limit
+        
+        # LRU of query embeddings; search() runs in worker threads, hence the lock
+        self._query_cache: OrderedDict = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._query_cache_lock = threading.Lock()
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for document chunks using sentence-transformers
+        On GPU the model runs under fp16 autocast, which halves activation memory
+        and allows much larger batches
+        """
+        with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=self._on_cuda):
+            embeddings = self.embedding_model.encode(
+                texts,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+                batch_size=256 if self._on_cuda else 32  # Embedding batch size
+            )
+        return embeddings.astype(np.float32, copy=False)
     
-    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using sentence-transformers"""
-        embeddings = self.embedding_model.encode(
-            texts,
-            show_progress_bar=True,
-            convert_to_numpy=True,
-            batch_size=32  # Embedding batch size
+    @staticmethod
+    def _chunk_id(chunk: str) -> str:
+        """Content-derived ID, so identical chunks map to the same record"""
+        return hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _add_batch(self, batch_chunks: List[str], metadata: Dict, offset: int, batch_num: int) -> List[str]:
+        """Embed one batch of chunks and add the new ones to the collection, returning their IDs"""
+        ids = [self._chunk_id(chunk) for chunk in batch_chunks]
+        
+        # Skip chunks already stored (re-ingested documents) and repeats within the batch
+        seen = set(self.collection.get(ids=ids, include=[])["ids"])
+        new_indices = []
+        for idx, chunk_id in enumerate(ids):
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                new_indices.append(idx)
+        
+        if not new_indices:
+            return []
+        
+        new_chunks = [batch_chunks[idx] for idx in new_indices]
+        
+        # Generate embeddings for the new chunks
+        embeddings = self._embed_batch(new_chunks)
+        
+        # Prepare metadata for this batch
+        metadatas = [
+            {
+                **(metadata or {}), 
+                "chunk_index": offset + idx,
+                "batch": batch_num
+            } 
+            for idx in new_indices
+        ]
+        
+        new_ids = [ids[idx] for idx in new_indices]
+        
+        # Upsert keeps concurrent ingestion of the same chunk a no-op
+        # (Chroma 0.4 validates embeddings as lists, so convert only here)
+        self.collection.upsert(
+            embeddings=embeddings.tolist(),
+            documents=new_chunks,
+            metadatas=metadatas,
+            ids=new_ids
         )
-        return embeddings.tolist()
+        
+        skipped = len(batch_chunks) - len(new_indices)
+        if skipped:
+            logger.info(f"Skipped {skipped} chunks already in the vector store")
+        return new_ids
     
-    def add_documents(self, chunks: List[str], metadata: Dict = None):
-        """Add document chunks to vector store with automatic batching"""
+    def add_documents(self, chunks: List[str], metadata: Dict = None) -> int:
+        """
+        Add document chunks to vector store with automatic batching
+        Returns how many were added (chunks already stored are skipped)
+        """
         if not chunks:
-            return
+            return 0
         
         total_chunks = len(chunks)
         logger.info(f"Adding {total_chunks} chunks to vector store")
+        added = 0
         
         # Process in batches
         for i in range(0, total_chunks, self.max_batch_size):
@@ -57,40 +133,111 @@ class VectorStore:
             
             logger.info(f"Processing batch {batch_num}/{total_batches} ({len(batch_chunks)} chunks)")
             
-            # Generate embeddings for this batch
-            embeddings = self._embed_texts(batch_chunks)
-            
-            # Generate IDs for this batch
-            ids = [str(uuid.uuid4()) for _ in batch_chunks]
-            
-            # Prepare metadata for this batch
-            metadatas = [
-                {
-                    **(metadata or {}), 
-                    "chunk_index": i + idx,
-                    "batch": batch_num
-                } 
-                for idx in range(len(batch_chunks))
-            ]
-            
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=batch_chunks,
-                metadatas=metadatas,
-                ids=ids
-            )
+            added += len(self._add_batch(batch_chunks, metadata, i, batch_num))
             
             logger.info(f"✅ Batch {batch_num}/{total_batches} added successfully")
         
-        logger.info(f"✅ All {total_chunks} chunks added to vector store")
+        logger.info(f"✅ Added {added} of {total_chunks} chunks to vector store")
+        return added
+    
+    def add_documents_stream(
+        self, 
+        chunks: Iterable[str], 
+        metadata: Dict = None,
+        batch_size: int = 32,
+        max_wait: float = 0.5
+    ) -> Tuple[int, int]:
+        """
+        Add chunks as they are produced
+        Returns (chunks received, chunks added); the difference were already stored
+        
+        The chunk iterable runs in a background thread; a batch is embedded once it
+        holds batch_size chunks or its first chunk has waited max_wait seconds,
+        so embedding overlaps with extraction instead of waiting for the whole document.
+        If anything fails, the chunks this call already wrote are deleted again
+        before the error is raised, so a retry doesn't leave a partial copy behind
+        """
+        stop = threading.Event()
+        pending = produce(chunks, stop=stop)
+        batch: List[str] = []
+        first_arrival = 0.0
+        total_chunks = 0
+        batch_num = 0
+        written: List[str] = []
+        
+        try:
+            while True:
+                timeout = max(0.0, first_arrival + max_wait - time.monotonic()) if batch else None
+                try:
+                    chunk = take(pending, timeout)
+                except queue.Empty:
+                    chunk = None
+                except StopIteration:
+                    break
+                
+                if chunk is not None:
+                    if not batch:
+                        first_arrival = time.monotonic()
+                    batch.append(chunk)
+                    if len(batch) < batch_size:
+                        continue
+                
+                batch_num += 1
+                written += self._add_batch(batch, metadata, total_chunks, batch_num)
+                total_chunks += len(batch)
+                batch = []
+            
+            if batch:
+                batch_num += 1
+                written += self._add_batch(batch, metadata, total_chunks, batch_num)
+                total_chunks += len(batch)
+        except BaseException:
+            if written:
+                logger.warning(f"Ingestion failed, removing {len(written)} chunks it added")
+                self.collection.delete(ids=written)
+            raise
+        finally:
+            # Don't leave the producer thread blocked on a full queue
+            stop.set()
+        
+        logger.info(
+            f"✅ Streamed {total_chunks} chunks in {batch_num} batches, "
+            f"added {len(written)} to vector store"
+        )
+        return total_chunks, len(written)
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing the embedding for repeated queries"""
+        key = hashlib.blake2b(query.encode('utf-8'), digest_size=8).digest()
+        
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+                return embedding
+        
+        # A single interactive query: no progress bar or batching
+        embedding = self.embedding_model.encode(
+            [query],
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )[0].astype(np.float32)
+        # Cached entries are shared between callers
+        embedding.setflags(write=False)
+        
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        
+        return embedding
     
     def search(self, query: str, n_results: int = 5) -> Dict:
         """Search for similar documents"""
-        query_embedding = self._embed_texts([query])[0]
+        query_embedding = self._embed_query(query)
         
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=[query_embedding.tolist()],
             n_results=n_results
         )
         
@@ -100,6 +247,18 @@ class VectorStore:
             "distances": results["distances"][0] if results["distances"] else []
         }
     
+    def prefetch(self):
+        """
+        Load the collection's HNSW index (and warm the embedding model) ahead of the first query
+        Chroma reads the index files from disk lazily on first search, so without this
+        the first user query pays that I/O
+        """
+        if self.collection.count() == 0:
+            return
+        
+        self.search("prefetch", n_results=1)
+        logger.info("Vector index prefetched")
+    
     def reset(self):
         """Clear all documents"""
         self.client.reset()
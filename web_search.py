@@ -1,6 +1,8 @@
-from duckduckgo_search import DDGS
-from typing import List, Dict
+from duckduckgo_search import AsyncDDGS
+from typing import List, Dict, Tuple
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -8,34 +10,82 @@ logger = logging.getLogger(__name__)
 class WebSearchTool:
     """Web search tool using DuckDuckGo"""
     
-    def __init__(self, max_results: int = 5):
+    def __init__(self, max_results: int = 5, ttl: int = 3600, max_cached: int = 1024):
         self.max_results = max_results
+        
+        # (normalized query, num_results) -> (fetched at, results)
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[Dict]]] = {}
+        self.ttl = ttl
+        self.max_cached = max_cached
     
     def search(self, query: str, num_results: int = None) -> List[Dict]:
         """
         Search the web using DuckDuckGo
+        Blocking wrapper around search_async for callers outside an event loop
+        
+        Returns:
+            List of search results with title, body, and href
+        """
+        return asyncio.run(self.search_async(query, num_results))
+    
+    async def search_async(self, query: str, num_results: int = None) -> List[Dict]:
+        """
+        Search the web using DuckDuckGo without blocking the event loop
         
         Returns:
             List of search results with title, body, and href
         """
+        num_results = num_results or self.max_results
+        key = (query.lower().strip(), num_results)
+        
+        cached = self._cache.get(key)
+        if cached is not None and time.time() - cached[0] < self.ttl:
+            logger.info(f"Web search cache hit for: {query}")
+            return cached[1]
+        
         try:
-            num_results = num_results or self.max_results
             logger.info(f"Performing web search for: {query}")
             
-            with DDGS() as ddgs:
-                results = list(ddgs.text(
-                    query, 
-                    max_results=num_results,
-                    region='wt-wt',  # Worldwide
-                    safesearch='moderate'
-                ))
+            async with AsyncDDGS() as ddgs:
+                results = [
+                    result async for result in ddgs.text(
+                        query, 
+                        max_results=num_results,
+                        region='wt-wt',  # Worldwide
+                        safesearch='moderate'
+                    )
+                ]
             
             logger.info(f"Found {len(results)} web results")
-            return results
             
         except Exception as e:
             logger.error(f"Web search failed: {e}")
             return []
+        
+        # Failed and empty searches aren't cached so they get retried
+        if results:
+            self._store(key, results)
+        return results
+    
+    def _store(self, key: Tuple[str, int], results: List[Dict]):
+        """Cache results, dropping expired entries once the cache is full"""
+        now = time.time()
+        self._cache.pop(key, None)  # a refreshed entry moves to the end
+        if len(self._cache) >= self.max_cached:
+            self._cache = {
+                k: entry for k, entry in self._cache.items()
+                if now - entry[0] < self.ttl
+            }
+            # Still full of live entries: drop the oldest (dicts keep insertion order)
+            while len(self._cache) >= self.max_cached:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now, results)
+    
+    async def search_many(self, queries: List[str], num_results: int = None) -> List[List[Dict]]:
+        """Run several searches concurrently; results are in the order of queries"""
+        return list(await asyncio.gather(
+            *(self.search_async(query, num_results) for query in queries)
+        ))
     
     def format_results(self, results: List[Dict]) -> str:
         """Format search results into readable text"""